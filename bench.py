@@ -0,0 +1,283 @@
+# Scenario benchmarks for the Plane Shooter update and draw hot paths.
+#
+#   python bench.py                      # all scenarios, JSON to stdout
+#   python bench.py --out new.json --compare old.json
+#   python bench.py --only particles_20k max_fire_rate --frames 300
+#
+# Every scenario is seeded, so two runs on the same machine do the same work
+# and their numbers can be compared directly.
+import os
+import sys
+import gc
+import json
+import time
+import platform
+import tracemalloc
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+import ps
+
+PHASES = ("tick", "collisions", "particles_update", "render", "particles_draw", "present", "frame")
+
+class Scenario:
+    """A named, seeded workload: how to start it and what to force every frame"""
+    def __init__(self, name, description, level=None, prepare=None):
+        self.name = name
+        self.description = description
+        self.level = level
+        self.prepare = prepare
+
+    def start(self, game, seed):
+        game.seed = seed
+        game.start_session(self.level)
+
+def keep_alive(game, frame):
+    # Scenarios measure a fixed load, so the player never dies mid-run
+    game.player.health = game.player.max_health
+
+def dense_spawns(game, frame):
+    keep_alive(game, frame)
+    if frame % 10 == 0:
+        game.enemy_spawn_timer = 121  # Endless mode spawns on the next tick
+
+def particle_load(target):
+    def prepare(game, frame):
+        keep_alive(game, frame)
+        missing = target - len(ps.global_particles)
+        if missing > 0:
+            ps.global_particles.emit(missing, (0, ps.WIDTH), (0, ps.HEIGHT),
+                                     dx=(-2, 2), dy=(-2, 2), size=(1, 4), life=(20, 60),
+                                     colors=ps.DEBRIS_COLORS)
+    return prepare
+
+def max_fire_rate(game, frame):
+    keep_alive(game, frame)
+    game.player.shoot_delay = 1
+    game.player.missiles = 99
+
+def homing_swarm(game, frame):
+    keep_alive(game, frame)
+    missing = 200 - len(game.enemy_bullets)
+    for _ in range(missing):
+        game.enemy_bullets.append(ps.pool.acquire(
+            ps.EnemyHomingMissile, ps.sim_rng.randint(ps.WIDTH // 2, ps.WIDTH),
+            ps.sim_rng.randint(0, ps.HEIGHT), game.player.x, game.player.y))
+
+SCENARIOS = [Scenario(f"level_{n}", f"level {n} with the autopilot", level=n, prepare=keep_alive)
+             for n in range(1, 8)]
+SCENARIOS += [
+    Scenario("endless_dense", "endless mode spawning an enemy every 10 ticks", prepare=dense_spawns),
+    Scenario("particles_1k", "endless mode with 1,000 live particles", prepare=particle_load(1000)),
+    Scenario("particles_5k", "endless mode with 5,000 live particles", prepare=particle_load(5000)),
+    Scenario("particles_20k", "endless mode with 20,000 live particles", prepare=particle_load(20000)),
+    Scenario("max_fire_rate", "level 5 with the player firing every tick", level=5, prepare=max_fire_rate),
+    Scenario("homing_swarm", "200 enemy homing missiles chasing the player", prepare=homing_swarm),
+]
+
+class PhaseClock:
+    """Wraps hot-path methods so each frame records the time spent inside them"""
+    def __init__(self):
+        self.current = dict.fromkeys(PHASES, 0.0)
+
+    def wrap(self, obj, name, phase):
+        method = getattr(obj, name)
+        current = self.current
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                current[phase] += (perf_counter() - start) * 1000
+        setattr(obj, name, timed)
+
+    def new_frame(self):
+        for phase in PHASES:
+            self.current[phase] = 0.0
+
+def autopilot_frame(game):
+    inputs = game.autopilot_inputs()
+    flags = ps.InputFrame.FIRE_MISSILE if inputs.get("fire_missile") else 0
+    return ps.InputFrame.capture(ps.HeadlessKeys(inputs["keys"]), (0, 0), flags)
+
+def run_frame(game, scenario, index):
+    """One full frame as Game.run does it: a single tick, render and present.
+
+    Returns perf_counter() at the start of the frame (after the scenario's
+    prepare) and after the tick, the render and the present.
+    """
+    scenario.prepare(game, index)
+    start = time.perf_counter()
+    game.save_previous_positions()
+    game.tick(autopilot_frame(game))
+    after_tick = time.perf_counter()
+    dirty_frame = game.render()
+    after_render = time.perf_counter()
+    game.present(dirty_frame)
+    return start, after_tick, after_render, time.perf_counter()
+
+def run_scenario(scenario, frames, warmup, seed, dirty_rects, alloc_frames):
+    game = ps.Game(save_file=None)
+    game.dirty_rendering = dirty_rects
+    scenario.start(game, seed)
+
+    clock = PhaseClock()
+    clock.wrap(game, "check_collisions", "collisions")
+    clock.wrap(ps.global_particles, "update", "particles_update")
+    clock.wrap(ps.global_particles, "draw", "particles_draw")
+
+    collections = [0]
+    def count_collections(phase, info):
+        if phase == "start":
+            collections[0] += 1
+    gc.callbacks.append(count_collections)
+
+    samples = {phase: [] for phase in PHASES}
+    measured = 0
+    try:
+        for index in range(warmup + frames):
+            if game.state != ps.GameState.PLAYING:
+                break
+            if index == warmup:
+                collections[0] = 0
+            clock.new_frame()
+            current = clock.current
+            start, after_tick, after_render, end = run_frame(game, scenario, index)
+            if index < warmup:
+                continue
+            current["tick"] = (after_tick - start) * 1000
+            current["render"] = (after_render - after_tick) * 1000
+            current["present"] = (end - after_render) * 1000
+            current["frame"] = (end - start) * 1000
+            for phase in PHASES:
+                samples[phase].append(current[phase])
+            measured += 1
+        end_state = game.get_state()
+    finally:
+        gc.callbacks.remove(count_collections)
+        # The particle system is shared by every Game, so take the wrappers off
+        del ps.global_particles.update, ps.global_particles.draw
+
+    result = {
+        "description": scenario.description,
+        "frames": measured,
+        "ms": {phase: summarize(values) for phase, values in samples.items()},
+        "gc_collections_per_frame": round(collections[0] / measured, 3) if measured else None,
+        "end_state": {key: end_state[key] for key in
+                      ("state", "enemies", "player_bullets", "enemy_bullets", "particles")},
+    }
+    if alloc_frames:
+        result["alloc"] = measure_allocations(scenario, alloc_frames, warmup, seed, dirty_rects)
+    return result
+
+def measure_allocations(scenario, frames, warmup, seed, dirty_rects):
+    """Re-run the scenario under tracemalloc, which is too slow to time with.
+
+    kib is the peak memory allocated during a frame above what was live at
+    its start (transient churn); blocks is the net change in allocated
+    blocks over the frame (steady growth means a leak or an unbounded cache).
+    """
+    game = ps.Game(save_file=None)
+    game.dirty_rendering = dirty_rects
+    scenario.start(game, seed)
+    for index in range(warmup):
+        if game.state != ps.GameState.PLAYING:
+            break
+        run_frame(game, scenario, index)
+
+    kib, blocks = [], []
+    tracemalloc.start()
+    try:
+        for index in range(warmup, warmup + frames):
+            if game.state != ps.GameState.PLAYING:
+                break
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            blocks_before = sys.getallocatedblocks()
+            run_frame(game, scenario, index)
+            _, peak = tracemalloc.get_traced_memory()
+            blocks.append(sys.getallocatedblocks() - blocks_before)
+            kib.append((peak - before) / 1024)
+    finally:
+        tracemalloc.stop()
+    return {"frames": len(kib), "kib": summarize(kib), "blocks": summarize(blocks)}
+
+def summarize(values):
+    if not values:
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "mean": round(float(values.mean()), 4),
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p99": round(float(np.percentile(values, 99)), 4),
+    }
+
+def compare(old, new):
+    """Print the change in mean frame and phase times against an earlier run"""
+    for name, result in new["scenarios"].items():
+        before = old.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        parts = []
+        for phase in ("frame", "tick", "render"):
+            a, b = before["ms"][phase], result["ms"][phase]
+            if a and b and a["mean"]:
+                parts.append(f"{phase} {a['mean']:.3f} -> {b['mean']:.3f} ms "
+                             f"({(b['mean'] / a['mean'] - 1) * 100:+.1f}%)")
+        print(f"{name:16} " + "  ".join(parts), file=sys.stderr)
+
+def main():
+    import argparse
+    names = [scenario.name for scenario in SCENARIOS]
+    parser = argparse.ArgumentParser(description="Plane Shooter scenario benchmarks")
+    parser.add_argument("--only", nargs="+", choices=names, metavar="SCENARIO",
+                        help=f"run only these scenarios: {', '.join(names)}")
+    parser.add_argument("--frames", type=int, default=600, help="measured frames per scenario")
+    parser.add_argument("--warmup", type=int, default=60, help="unmeasured frames run first")
+    parser.add_argument("--alloc-frames", type=int, default=120,
+                        help="frames to trace for allocations, 0 to skip")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dirty-rects", action="store_true", help="render with dirty rectangles")
+    parser.add_argument("--out", metavar="FILE", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", metavar="FILE", help="earlier report to print deltas against")
+    args = parser.parse_args()
+
+    ps.bootstrap(headless=True)
+    ps.prewarm_rotation_cache()
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "seed": args.seed,
+            "frames": args.frames,
+            "warmup": args.warmup,
+            "dirty_rects": args.dirty_rects,
+        },
+        "scenarios": {},
+    }
+    for scenario in SCENARIOS:
+        if args.only and scenario.name not in args.only:
+            continue
+        print(f"running {scenario.name}...", file=sys.stderr)
+        report["scenarios"][scenario.name] = run_scenario(
+            scenario, args.frames, args.warmup, args.seed, args.dirty_rects, args.alloc_frames)
+
+    text = json.dumps(report, indent=4)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,55 @@ import sys
 import os
 import math
 import json
+import hashlib
+import struct
+import zlib
+import time
+import contextlib
+import copy
+import atexit
+import queue
+import threading
+from collections import OrderedDict, deque
 from enum import Enum
+from operator import itemgetter
+from types import SimpleNamespace
+import numpy as np
+
+# Headless mode: no real window or audio device, used for simulation runs
+HEADLESS = (os.environ.get("PS_HEADLESS") == "1" or "--headless" in sys.argv
+            or "--replay" in sys.argv)
+# Dirty-rectangle rendering: only redraw and present the regions that changed
+DIRTY_RECTS = os.environ.get("PS_DIRTY_RECTS") == "1" or "--dirty-rects" in sys.argv
+# Baked assets and compiled data that are slow to rebuild, keyed by their sources
+CACHE_DIR = os.environ.get("PS_CACHE_DIR", ".cache")
 
-# Initialize Pygame
-pygame.init()
 WIDTH, HEIGHT = 1000, 660
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Plane Shooter")
-global_particles = []
+screen = None  # The window surface, created by bootstrap()
+
+class StartupProfiler:
+    """Wall-clock time of each startup step, shown with --profile-startup"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps = []  # (step, ms)
+
+    @contextlib.contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, ms):
+        self.steps.append((name, ms))
+
+    def report(self):
+        lines = [f"{name:<20}{ms:9.1f} ms" for name, ms in self.steps]
+        lines.append(f"{'since import':<20}{(time.perf_counter() - self.started) * 1000:9.1f} ms")
+        return "\n".join(lines)
+
+startup_profiler = StartupProfiler()
 
 # Game States
 class GameState(Enum):
@@ -24,6 +65,7 @@ class GameState(Enum):
     QUIT = 5
     LEVEL_SELECT = 6
     LEVEL_COMPLETE = 7
+    LOADING = 8
 
 # Colors (fallback if images fail)
 BLACK = (0, 0, 0)
@@ -37,67 +79,763 @@ YELLOW = (255, 255, 0)
 PURPLE = (150, 50, 200)
 ORANGE = (255, 165, 0)
 
-# Load images with error handling
+# Particle palettes
+DEBRIS_COLORS = [(255, 255, 100), (255, 200, 50), (200, 200, 200),
+                 (120, 120, 120), (255, 255, 255), (100, 180, 255)]
+FIRE_COLORS = [(255, g, 0) for g in range(100, 201, 20)]
+SMOKE_COLORS = [(v, v, v) for v in range(50, 101, 10)]
+
+class ParticleSystem:
+    """Every live particle in one struct-of-arrays store.
+
+    Columns are NumPy arrays so a frame's movement, ageing and removal of
+    dead particles is a handful of vectorized operations instead of a
+    Python loop over dicts. Emitters pass either a fixed value or a
+    (low, high) range for each attribute; ranges are sampled per particle.
+    """
+    def __init__(self, capacity=1024):
+        self.count = 0
+        self.rng = np.random.default_rng()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.dx = np.zeros(capacity)
+        self.dy = np.zeros(capacity)
+        self.size = np.zeros(capacity, dtype=np.int32)
+        self.life = np.zeros(capacity, dtype=np.int32)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+
+    def _columns(self):
+        return (self.x, self.y, self.dx, self.dy, self.size, self.life, self.color)
+
+    def _reserve(self, extra):
+        needed = self.count + extra
+        capacity = len(self.x)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        old = self._columns()
+        self._allocate(capacity)
+        for new_col, old_col in zip(self._columns(), old):
+            new_col[:self.count] = old_col[:self.count]
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def _sample(self, value, n):
+        if isinstance(value, tuple):
+            return self.rng.uniform(value[0], value[1], n)
+        return value
+
+    def _sample_int(self, value, n):
+        if isinstance(value, tuple):
+            return self.rng.integers(value[0], value[1] + 1, n)
+        return value
+
+    def emit(self, count, x, y, dx=0, dy=0, size=2, life=20, colors=(WHITE,)):
+        """Spawn count particles; size and life ranges are inclusive"""
+        if count <= 0:
+            return
+        self._reserve(count)
+        start, end = self.count, self.count + count
+        self.x[start:end] = self._sample(x, count)
+        self.y[start:end] = self._sample(y, count)
+        self.dx[start:end] = self._sample(dx, count)
+        self.dy[start:end] = self._sample(dy, count)
+        self.size[start:end] = self._sample_int(size, count)
+        self.life[start:end] = self._sample_int(life, count)
+        palette = np.asarray(colors, dtype=np.uint8)
+        self.color[start:end] = palette[self.rng.integers(0, len(palette), count)]
+        self.count = end
+
+    def update(self):
+        n = self.count
+        if n == 0:
+            return
+        self.x[:n] += self.dx[:n]
+        self.y[:n] += self.dy[:n]
+        self.life[:n] -= 1
+
+        alive = self.life[:n] > 0
+        live_count = int(np.count_nonzero(alive))
+        if live_count < n:
+            for col in self._columns():
+                col[:live_count] = col[:n][alive]
+            self.count = live_count
+
+    def draw(self, surface):
+        n = self.count
+        if n == 0:
+            return
+        draw_circle = pygame.draw.circle
+        xs = self.x[:n].astype(np.int32).tolist()
+        ys = self.y[:n].astype(np.int32).tolist()
+        for x, y, size, color in zip(xs, ys, self.size[:n].tolist(), self.color[:n].tolist()):
+            draw_circle(surface, color, (x, y), size)
+
+global_particles = ParticleSystem()
+
+# Load images with error handling. Returns the decoded surface without
+# converting it to the display format, so it is safe on the loader thread.
 def load_image(name, scale=1):
     try:
-        img = pygame.image.load(os.path.join("assets", name)).convert_alpha()
+        img = pygame.image.load(os.path.join("assets", name))
         return pygame.transform.scale(img, 
                (int(img.get_width() * scale), 
                (int(img.get_height() * scale))))
     except:
         print(f"Failed to load {name}, using placeholder")
-        # Create colored rectangles as fallback
-        surf = pygame.Surface((50, 30), pygame.SRCALPHA)
-        if "player" in name:
-            pygame.draw.polygon(surf, BLUE, [(50,15), (0,0), (0,30)])
-        elif "enemy" in name:
-            pygame.draw.polygon(surf, RED, [(0,15), (50,0), (50,30)])
-        elif "bullet" in name:
-            surf = pygame.Surface((10, 5), pygame.SRCALPHA)
-            pygame.draw.rect(surf, GREEN, (0, 0, 10, 5))
-        return surf
+        return placeholder_image(name)
+
+def placeholder_image(name):
+    # Create colored rectangles as fallback
+    surf = pygame.Surface((50, 30), pygame.SRCALPHA)
+    if "player" in name:
+        pygame.draw.polygon(surf, BLUE, [(50,15), (0,0), (0,30)])
+    elif "enemy" in name:
+        pygame.draw.polygon(surf, RED, [(0,15), (50,0), (50,30)])
+    elif "bullet" in name:
+        surf = pygame.Surface((10, 5), pygame.SRCALPHA)
+        pygame.draw.rect(surf, GREEN, (0, 0, 10, 5))
+    return surf
+
+# Sprites baked into the atlas: name -> (source file, load scale, final size)
+SPRITE_SOURCES = {
+    "player": ("player.png", 0.7, (50, 30)),
+    "enemy": ("enemy.png", 0.7, (50, 30)),
+    "bullet": ("bullet-1.png", 0.5, (10, 5)),
+}
+# Mirrored/rotated variants baked with them: name -> (sprite, flip x, rotation)
+SPRITE_VARIANTS = {
+    "enemy_bullet": ("bullet", True, 0),
+    "enemy_flipped": ("enemy", True, 0),
+    "bomb": ("bullet", False, -90),
+}
+ASSET_BAKE_VERSION = 1
 
-# Load all assets
-try:
-    bg_img = pygame.image.load(os.path.join("assets", "bg.png")).convert()
-    bg_img = pygame.transform.scale(bg_img, (WIDTH, HEIGHT))
-except:
-    print("Failed to load background, using black")
-    bg_img = None
-
-player_img = load_image("player.png", 0.7)
-enemy_img = load_image("enemy.png", 0.7)
-bullet_img = load_image("bullet-1.png", 0.5)
-
-# After loading images, force specific sizes:
-player_img = pygame.transform.scale(player_img, (50, 30))      # Width, Height
-enemy_img = pygame.transform.scale(enemy_img, (50, 30))
-bullet_img = pygame.transform.scale(bullet_img, (10, 5))
-homing_missile_img = bullet_img  # Using same image for now
-
-# Load sounds
-try:
+def asset_bake_key():
+    """Hash of the bake recipe and the mtime/size of every source file"""
+    sources = ["bg.png"] + [source for source, _, _ in SPRITE_SOURCES.values()]
+    stamps = []
+    for source in sources:
+        try:
+            st = os.stat(os.path.join("assets", source))
+            stamps.append((source, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamps.append((source, None, None))
+    recipe = (ASSET_BAKE_VERSION, WIDTH, HEIGHT, SPRITE_SOURCES, SPRITE_VARIANTS, stamps)
+    return hashlib.sha1(repr(recipe).encode()).hexdigest()
+
+def pack_atlas(sprites, width=256, padding=1):
+    """Shelf-pack sprites into one surface; returns it and each sprite's rect"""
+    rects = {}
+    x = y = shelf_height = 0
+    for name, img in sorted(sprites.items(), key=lambda item: -item[1].get_height()):
+        w, h = img.get_size()
+        if x + w > width:
+            x, y = 0, y + shelf_height + padding
+            shelf_height = 0
+        rects[name] = (x, y, w, h)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+    atlas = pygame.Surface((width, y + shelf_height), pygame.SRCALPHA)
+    for name, img in sprites.items():
+        atlas.blit(img, rects[name][:2])
+    return atlas, rects
+
+def build_sprites(load):
+    """Every sprite and variant, with load(source, scale) supplying the images"""
+    sprites = {}
+    for name, (source, scale, size) in SPRITE_SOURCES.items():
+        sprites[name] = pygame.transform.scale(load(source, scale), size)
+    for name, (base, flip_x, angle) in SPRITE_VARIANTS.items():
+        img = pygame.transform.flip(sprites[base], flip_x, False)
+        sprites[name] = pygame.transform.rotate(img, angle) if angle else img
+    return sprites
+
+def bake_assets():
+    """Decode, scale and pack every image into raw pixel data ready to cache"""
+    atlas, rects = pack_atlas(build_sprites(load_image))
+    baked = {"atlas": (atlas.get_size(), pygame.image.tobytes(atlas, "RGBA")),
+             "rects": rects, "bg": None}
+    try:
+        bg = pygame.image.load(os.path.join("assets", "bg.png"))
+        bg = pygame.transform.scale(bg, (WIDTH, HEIGHT))
+        baked["bg"] = (bg.get_size(), pygame.image.tobytes(bg, "RGB"))
+    except:
+        print("Failed to load background, using black")
+    return baked
+
+# Baked asset cache: a header, one rect per sprite, then the atlas's RGBA
+# pixels and the background's RGB pixels (none when its size is 0 x 0)
+ASSET_CACHE_MAGIC = b"PSAT"
+ASSET_CACHE_HEADER = struct.Struct("<4sBHHHHB")  # magic, bake version, atlas w/h, bg w/h, sprites
+ASSET_CACHE_RECT = struct.Struct("<16sHHHH")     # sprite name, x, y, w, h
+
+def encode_baked_assets(baked):
+    (atlas_w, atlas_h), atlas_pixels = baked["atlas"]
+    (bg_w, bg_h), bg_pixels = baked["bg"] or ((0, 0), b"")
+    parts = [ASSET_CACHE_HEADER.pack(ASSET_CACHE_MAGIC, ASSET_BAKE_VERSION, atlas_w, atlas_h,
+                                     bg_w, bg_h, len(baked["rects"]))]
+    parts += [ASSET_CACHE_RECT.pack(name.encode(), *rect) for name, rect in baked["rects"].items()]
+    parts += [atlas_pixels, bg_pixels]
+    return b"".join(parts)
+
+def decode_baked_assets(data):
+    """The baked assets in a cache file, raising ValueError unless they are complete"""
+    if len(data) < ASSET_CACHE_HEADER.size:
+        raise ValueError("truncated header")
+    magic, version, atlas_w, atlas_h, bg_w, bg_h, count = ASSET_CACHE_HEADER.unpack_from(data)
+    if magic != ASSET_CACHE_MAGIC or version != ASSET_BAKE_VERSION:
+        raise ValueError("not a current asset cache")
+    offset = ASSET_CACHE_HEADER.size
+    atlas_size, bg_size = atlas_w * atlas_h * 4, bg_w * bg_h * 3
+    if len(data) != offset + count * ASSET_CACHE_RECT.size + atlas_size + bg_size:
+        raise ValueError("wrong length")
+    rects = {}
+    for name, x, y, w, h in ASSET_CACHE_RECT.iter_unpack(data[offset:offset + count * ASSET_CACHE_RECT.size]):
+        if x + w > atlas_w or y + h > atlas_h:
+            raise ValueError("sprite outside the atlas")
+        rects[name.rstrip(b"\0").decode()] = (x, y, w, h)
+    if rects.keys() != SPRITE_SOURCES.keys() | SPRITE_VARIANTS.keys():
+        raise ValueError("wrong sprites")
+    offset += count * ASSET_CACHE_RECT.size
+    baked = {"atlas": ((atlas_w, atlas_h), data[offset:offset + atlas_size]),
+             "rects": rects, "bg": None}
+    if bg_size:
+        baked["bg"] = ((bg_w, bg_h), data[offset + atlas_size:])
+    return baked
+
+def read_baked_assets():
+    """The baked images from CACHE_DIR, baking and caching them if the sources changed"""
+    path = os.path.join(CACHE_DIR, f"assets-{asset_bake_key()}.bin")
+    try:
+        with open(path, "rb") as f:
+            return decode_baked_assets(f.read())
+    except Exception:
+        pass  # Missing or damaged: bake again
+    baked = bake_assets()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(encode_baked_assets(baked))
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass  # The cache only saves time; run without it
+    return baked
+
+def publish_images(sprites, bg):
+    """Make these the images every sprite is drawn and spawned with"""
+    global player_img, enemy_img, bullet_img, homing_missile_img
+    global enemy_bullet_img, enemy_flipped_img, bomb_img, bg_img
+    player_img = sprites["player"]
+    enemy_img = sprites["enemy"]
+    bullet_img = sprites["bullet"]
+    homing_missile_img = bullet_img  # Using same image for now
+
+    # Mirrored/rotated variants, built once instead of per instance
+    enemy_bullet_img = sprites["enemy_bullet"]
+    enemy_flipped_img = sprites["enemy_flipped"]
+    bomb_img = sprites["bomb"]
+    bg_img = bg
+
+def publish_baked_images(baked):
+    # Display-format conversion has to happen on the main thread
+    size, pixels = baked["atlas"]
+    atlas = pygame.image.frombuffer(pixels, size, "RGBA").convert_alpha()
+    sprites = {name: atlas.subsurface(rect) for name, rect in baked["rects"].items()}
+    bg = None
+    if baked["bg"]:
+        size, pixels = baked["bg"]
+        bg = pygame.image.frombuffer(pixels, size, "RGB").convert()
+    publish_images(sprites, bg)
+
+class VoiceManager:
+    """Budgets mixer voices for the sound effects.
+
+    play() only records a request. flush(), called once per frame, plays
+    each requested sound at most once however many times it was asked for.
+    A sound that already has its maximum number of voices going cuts off
+    its own oldest voice and reuses that channel, so new shots and
+    explosions are always heard at the cost of the tails of older ones.
+    Higher priority sounds are served first and take over the
+    longest-playing channel when the mixer is full.
+    """
+    def __init__(self):
+        self.sounds = {}   # name -> (Sound, max voices, priority)
+        self.channels = {}  # name -> channels it was started on, oldest first
+        self.pending = {}  # name -> requests since the last flush
+        self.requested = {}
+        self.played = {}
+
+    def register(self, name, sound, max_voices, priority=0):
+        self.sounds[name] = (sound, max_voices, priority)
+
+    def play(self, name):
+        self.pending[name] = self.pending.get(name, 0) + 1
+
+    def flush(self):
+        if not self.pending:
+            return
+        sounds = self.sounds
+        for name in sorted(self.pending, key=lambda name: -sounds[name][2] if name in sounds else 0):
+            self.requested[name] = self.requested.get(name, 0) + self.pending[name]
+            if name not in sounds:
+                continue  # Not loaded (yet)
+            sound, max_voices, priority = sounds[name]
+            # Drop channels that finished or were taken over by another sound
+            voices = [channel for channel in self.channels.get(name, ())
+                      if channel.get_sound() is sound]
+            if len(voices) >= max_voices:
+                channel = voices.pop(0)  # Steal the oldest voice of the same sound
+                channel.stop()
+            else:
+                channel = pygame.mixer.find_channel(priority > 0)
+                if channel is None:
+                    self.channels[name] = voices
+                    continue
+            channel.play(sound)
+            voices.append(channel)
+            self.channels[name] = voices
+            self.played[name] = self.played.get(name, 0) + 1
+        self.pending.clear()
+
+    def stats(self):
+        return {name: {"requested": count, "played": self.played.get(name, 0)}
+                for name, count in self.requested.items()}
+
+voices = VoiceManager()
+
+def load_sound(name):
+    return pygame.mixer.Sound(os.path.join("assets", name))
+
+def publish_sounds(sounds):
+    # Explosions win over shots when the mixer runs out of channels
+    voices.register("shoot", sounds["shoot.mp3"], max_voices=3)
+    voices.register("explosion", sounds["explosion.mp3"], max_voices=3, priority=1)
+
+def load_music():
     pygame.mixer.music.load(os.path.join("assets", "music.mp3"))
-    shoot_sound = pygame.mixer.Sound(os.path.join("assets", "shoot.mp3"))
-    explosion_sound = pygame.mixer.Sound(os.path.join("assets", "explosion.mp3"))
-    has_sound = True
-except:
-    print("Failed to load sound files")
-    has_sound = False
 
-# Play background music
-if has_sound:
-    pygame.mixer.music.play(-1)  # -1 means loop indefinitely
+def start_music(_):
+    # Play background music
+    if not HEADLESS:
+        pygame.mixer.music.play(-1)  # -1 means loop indefinitely
+
+class AssetLoader:
+    """Loads images and sounds on a worker thread while the game runs.
+
+    The worker only reads and decodes files; results are handed back
+    through a queue and published by poll() on the main thread, which the
+    game loop calls every frame. Until then placeholders stand in: colored
+    shapes for sprites, a black background and no sound. Images come
+    first, because anything spawned before they arrive keeps the
+    placeholder; the slow MP3 decodes stream in while the menu is up.
+    """
+    def __init__(self):
+        # (description, work on the loader thread, publish on the main thread)
+        self.steps = [
+            ("images", read_baked_assets, publish_baked_images),
+            ("sounds", lambda: {name: load_sound(name) for name in ("shoot.mp3", "explosion.mp3")},
+             publish_sounds),
+            ("music", load_music, start_music),
+        ]
+        self.results = queue.Queue()
+        self.thread = None
+        self.finished = 0
+        self.images_ready = False
+        self.prewarm = False  # Fill the rotation cache once the sprites are in
+
+    @property
+    def done(self):
+        return self.finished == len(self.steps)
+
+    @property
+    def progress(self):
+        return self.finished / len(self.steps)
+
+    @property
+    def current(self):
+        """Description of the step being loaded, None when done"""
+        return None if self.done else self.steps[self.finished][0]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.work, name="asset-loader", daemon=True)
+        self.thread.start()
+
+    def work(self):
+        for description, load, _ in self.steps:
+            start = time.perf_counter()
+            try:
+                result, ok = load(), True
+            except Exception as e:
+                result, ok = e, False
+            self.results.put((description, ok, result, (time.perf_counter() - start) * 1000))
+
+    def poll(self):
+        """Publish whatever the worker has finished since the last call"""
+        while not self.done:
+            try:
+                description, ok, result, ms = self.results.get_nowait()
+            except queue.Empty:
+                return
+            startup_profiler.add(f"load {description}", ms)
+            self.publish(description, ok, result)
+
+    def load_now(self):
+        """Load everything on the calling thread, for headless runs"""
+        for description, load, _ in self.steps:
+            with startup_profiler.step(f"load {description}"):
+                try:
+                    result, ok = load(), True
+                except Exception as e:
+                    result, ok = e, False
+                self.publish(description, ok, result)
+
+    def publish(self, description, ok, result):
+        publish = self.steps[self.finished][2]
+        self.finished += 1
+        if ok:
+            try:
+                publish(result)
+            except Exception as e:
+                ok, result = False, e
+        if not ok:
+            print(f"Failed to load {description}: {result}")
+        if description == "images":
+            # Without the images the placeholders stay; the menu opens either way
+            self.images_ready = True
+            if self.prewarm:
+                prewarm_rotation_cache()
+
+# Placeholders until the loader publishes the real images; sound effects
+# stay silent until they are registered with voices
+publish_images(build_sprites(lambda source, scale: placeholder_image(source)), None)
+assets = AssetLoader()
+
+class ObjectPool:
+    """Free lists of retired objects, keyed by class.
+
+    acquire() hands back a released instance re-initialised through its
+    reset() method, and only constructs a new one when the free list for
+    that class is empty. release() calls the object's retire() method, if
+    it has one. Hit/miss counters show how well reuse works.
+    """
+    def __init__(self):
+        self.free = {}
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, cls, *args, **kwargs):
+        free = self.free.get(cls)
+        if free:
+            obj = free.pop()
+            obj.reset(*args, **kwargs)
+            self.hits += 1
+        else:
+            obj = cls(*args, **kwargs)
+            self.misses += 1
+        obj.pooled = False
+        return obj
+
+    def release(self, obj):
+        if getattr(obj, "pooled", False):
+            return  # Already back in the pool
+        obj.pooled = True
+        retire = getattr(obj, "retire", None)
+        if retire is not None:
+            retire()
+        self.free.setdefault(type(obj), []).append(obj)
+
+    def release_all(self, objs):
+        for obj in objs:
+            self.release(obj)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "free": sum(len(free) for free in self.free.values()),
+        }
+
+pool = ObjectPool()
+
+class RotationCache:
+    """Rotated copies of sprites, keyed by (source surface, quantized angle).
+
+    Angles are snapped to `step` degrees so steady-state frames reuse a
+    small set of pre-rotated surfaces instead of calling
+    pygame.transform.rotate per object per frame. The least recently used
+    entries are evicted once `max_size` is exceeded.
+    """
+    def __init__(self, step=3, max_size=1024):
+        self.step = step
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, angle):
+        return int(round(angle / self.step)) * self.step % 360
+
+    def get(self, surface, angle):
+        angle = self.quantize(angle)
+        if angle == 0:
+            return surface
+        key = (surface, angle)
+        rotated = self.cache.get(key)
+        if rotated is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return rotated
+
+        self.misses += 1
+        rotated = pygame.transform.rotate(surface, angle)
+        self.cache[key] = rotated
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return rotated
+
+    def prewarm(self, surface, min_angle=0, max_angle=359):
+        for angle in range(min_angle, max_angle + 1, self.step):
+            self.get(surface, angle)
+
+rotation_cache = RotationCache()
+
+class TextCache:
+    """Rendered text surfaces keyed by (font, string, color), LRU bounded"""
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, font, text, color):
+        key = (font, text, color)
+        surf = self.cache.get(key)
+        if surf is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return surf
+
+        self.misses += 1
+        surf = font.render(text, True, color)
+        self.cache[key] = surf
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return surf
+
+class GlyphAtlas:
+    """Digits and number punctuation for one font/color, rendered once into a
+    single surface so changing numbers are composed from glyph blits"""
+    CHARS = "0123456789/-."
+
+    def __init__(self, font, color):
+        glyphs = [font.render(ch, True, color) for ch in self.CHARS]
+        self.height = max(g.get_height() for g in glyphs)
+        self.surface = pygame.Surface((sum(g.get_width() for g in glyphs), self.height),
+                                      pygame.SRCALPHA)
+        self.rects = {}
+        x = 0
+        for ch, glyph in zip(self.CHARS, glyphs):
+            self.surface.blit(glyph, (x, 0))
+            self.rects[ch] = pygame.Rect(x, 0, glyph.get_width(), self.height)
+            x += glyph.get_width()
+
+    def draw(self, surface, text, pos):
+        """Blit text glyph by glyph; returns the x coordinate after the last glyph"""
+        x, y = pos
+        for ch in text:
+            area = self.rects[ch]
+            surface.blit(self.surface, (x, y), area)
+            x += area.width
+        return x
+
+class HudText:
+    """Draws HUD lines from cached labels and atlas digits.
+
+    Parts are drawn left to right: strings come from the text cache (only
+    rendered the first time they are seen) and ints are composed from the
+    glyph atlas, so a changing score never triggers a font render.
+    """
+    def __init__(self):
+        self.text_cache = TextCache()
+        self.atlases = {}
+
+    def atlas(self, font, color):
+        atlas = self.atlases.get((font, color))
+        if atlas is None:
+            atlas = self.atlases[(font, color)] = GlyphAtlas(font, color)
+        return atlas
+
+    def draw(self, surface, font, color, pos, *parts):
+        x, y = pos
+        for part in parts:
+            if isinstance(part, int):
+                x = self.atlas(font, color).draw(surface, str(part), (x, y))
+            else:
+                text = self.text_cache.get(font, part, color)
+                surface.blit(text, (x, y))
+                x += text.get_width()
+        return x
+
+hud_text = HudText()
+
+fonts = {}
+
+def get_font(size):
+    """The default font at this size, created on first use"""
+    font = fonts.get(size)
+    if font is None:
+        with startup_profiler.step(f"font {size}"):
+            font = fonts[size] = pygame.font.Font(None, size)
+    return font
+
+def prewarm_rotation_cache():
+    """Pre-rotate every sprite over the angle range it can be drawn at"""
+    rotation_cache.prewarm(homing_missile_img)          # Missiles steer freely
+    rotation_cache.prewarm(player_img, -12, 12)         # Pitch from vertical speed
+    rotation_cache.prewarm(enemy_img, -25, 25)          # Enemy5 steering range
+    rotation_cache.prewarm(enemy_bullet_img, -25, 25)   # Enemy5 angled shots
+
+class SimulationClock:
+    """Game time measured in fixed simulation ticks, not wall-clock time.
+
+    Advanced once per update_game tick, so timers that read it behave the
+    same at any render rate, under fast-forward and on slow machines.
+    """
+    def __init__(self, tick_rate=60):
+        self.tick_rate = tick_rate
+        self.tick_seconds = 1 / tick_rate
+        self.ticks = 0
+
+    def advance(self):
+        self.ticks += 1
+
+    def get_ticks(self):
+        """Simulation milliseconds, a drop-in for pygame.time.get_ticks()"""
+        return self.ticks * 1000 // self.tick_rate
+
+sim_clock = SimulationClock()
+
+# Every random draw that affects gameplay goes through sim_rng (and the
+# particle system's numpy generator), so a session seed reproduces a run.
+# Purely cosmetic draw-time jitter keeps using the random module.
+sim_rng = random.Random()
+
+def seed_simulation(seed):
+    """Reset simulation time and reseed all gameplay randomness"""
+    sim_rng.seed(seed)
+    global_particles.rng = np.random.default_rng(seed)
+    sim_clock.ticks = 0
+
+class HeadlessKeys:
+    """Stands in for pygame.key.get_pressed() when there is no window"""
+    def __init__(self, pressed=()):
+        self.pressed = set(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+class InputFrame:
+    """Everything the simulation reads from the player during one tick"""
+    # Held keys, one bit each in this order
+    KEYS = (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d, pygame.K_SPACE)
+    # One-shot actions and mouse button
+    FIRE_MISSILE = 1
+    TOGGLE_MOUSE = 2
+    MOUSE_DOWN = 4
+
+    __slots__ = ("key_bits", "mouse_x", "mouse_y", "flags")
+
+    def __init__(self, key_bits=0, mouse_x=0, mouse_y=0, flags=0):
+        self.key_bits = key_bits
+        self.mouse_x = mouse_x
+        self.mouse_y = mouse_y
+        self.flags = flags
+
+    @classmethod
+    def capture(cls, keys, mouse_pos, flags=0):
+        """Build a frame from a get_pressed()-style key lookup"""
+        key_bits = 0
+        for bit, key in enumerate(cls.KEYS):
+            if keys[key]:
+                key_bits |= 1 << bit
+        return cls(key_bits, int(mouse_pos[0]), int(mouse_pos[1]), flags)
+
+    def keys(self):
+        return HeadlessKeys(key for bit, key in enumerate(self.KEYS)
+                            if self.key_bits & (1 << bit))
+
+    @property
+    def mouse_pos(self):
+        return (self.mouse_x, self.mouse_y)
+
+class InputRecording:
+    """Seed, starting level, player upgrades and per-tick inputs of one play session.
+
+    Saved as a small binary file: a header followed by one fixed-size
+    record per simulation tick holding the input and the state hash
+    after that tick, so a replay can report where it diverged.
+    """
+    MAGIC = b"PSRP"
+    VERSION = 4  # Bumped when the same inputs no longer replay the same game
+    # magic, version, seed, level (0 = endless), tick rate, max health, shoot delay
+    HEADER = struct.Struct("<4sBQHHHH")
+    RECORD = struct.Struct("<BhhBI")   # keys, mouse x, mouse y, flags, state hash
+
+    def __init__(self, seed, level=None, tick_rate=60, max_health=100, shoot_delay=15):
+        self.seed = seed
+        self.level = level
+        self.tick_rate = tick_rate
+        self.max_health = max_health  # Shop upgrades the session was played with
+        self.shoot_delay = shoot_delay
+        self.frames = []   # (InputFrame, state hash) per tick
+
+    def append(self, frame, state_hash):
+        self.frames.append((frame, state_hash))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def save(self, path):
+        pack = self.RECORD.pack
+        with open(path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.level or 0,
+                                     self.tick_rate, self.max_health, self.shoot_delay))
+            f.write(b"".join(pack(frame.key_bits, frame.mouse_x, frame.mouse_y,
+                                  frame.flags, state_hash)
+                             for frame, state_hash in self.frames))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < cls.HEADER.size:
+            raise ValueError(f"{path} is not a version {cls.VERSION} replay file")
+        magic, version, seed, level, tick_rate, max_health, shoot_delay = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"{path} is not a version {cls.VERSION} replay file")
+        recording = cls(seed, level or None, tick_rate, max_health, shoot_delay)
+        for key_bits, mx, my, flags, state_hash in cls.RECORD.iter_unpack(data[cls.HEADER.size:]):
+            recording.append(InputFrame(key_bits, mx, my, flags), state_hash)
+        return recording
 
 class Player:
     def __init__(self):
         self.reset()
         
     def reset(self):
-        self.x = 100
-        self.y = HEIGHT // 2
+        self.x = self.prev_x = 100
+        self.y = self.prev_y = HEIGHT // 2
         self.img = player_img
-        self.bullets = []
+        self.bullets = EntityArena()
         self.shoot_cooldown = 0
         self.shoot_delay = 15
         self.max_health = 100
@@ -132,8 +870,6 @@ class Player:
         self.invulnerable = False
         self.death_animation = False
         self.death_timer = 0
-        self.death_particles = []
-        self.hit_particles = []
         self.dead = False
         self.death_complete = False
 
@@ -145,27 +881,17 @@ class Player:
                                self.img.get_width() if self.img else 40,
                                self.img.get_height() if self.img else 30)
 
-    def fire_missile(self, enemies):
+    def fire_missile(self, targets):
+        """Launch a homing missile at the enemy closest to the player, if any"""
         if self.missiles > 0 and not self.dead:
-            closest_enemy = None
-            min_distance = float('inf')
-            
-            for enemy in enemies:
-                if not enemy.dead:
-                    dist = math.sqrt((enemy.rect.centerx - self.rect.centerx)**2 + 
-                                    (enemy.rect.centery - self.rect.centery)**2)
-                    if dist < min_distance:
-                        min_distance = dist
-                        closest_enemy = enemy
-            
+            closest_enemy = targets.nearest(self.rect.centerx, self.rect.centery)
             if closest_enemy:
                 self.missiles -= 1
-                if has_sound:
-                    shoot_sound.play()
-                return PlayerHomingMissile(self.x + self.rect.width, 
-                                        self.y + self.rect.height//2,
-                                        closest_enemy.rect.centerx,
-                                        closest_enemy.rect.centery)
+                voices.play("shoot")
+                return pool.acquire(PlayerHomingMissile,
+                                    self.x + self.rect.width, 
+                                    self.y + self.rect.height//2,
+                                    closest_enemy)
         return None
 
     def handle_input(self, keys, mouse_pos=None):
@@ -234,31 +960,19 @@ class Player:
 
     def shoot(self):
         if self.shoot_cooldown <= 0:
-            self.bullets.append(Bullet(self.x + self.rect.width, 
-                                    self.y + self.rect.height//2, 
-                                    True, damage=10))
+            self.bullets.append(pool.acquire(Bullet,
+                                             self.x + self.rect.width, 
+                                             self.y + self.rect.height//2, 
+                                             True, damage=10))
             self.shoot_cooldown = self.shoot_delay
-            if has_sound:
-                shoot_sound.play()
+            voices.play("shoot")
 
     def flash(self):
         self.hit_flash = 10
         self.invulnerable = True
-        for _ in range(8):
-            color = random.choice([
-                (255, 255, 100), (255, 200, 50), 
-                (200, 200, 200), (120, 120, 120),
-                (255, 255, 255), (100, 180, 255)
-            ])
-            self.hit_particles.append({
-                'x': self.rect.centerx,
-                'y': self.rect.centery,
-                'dx': random.uniform(-2, 2),
-                'dy': random.uniform(-2, 2),
-                'size': random.randint(2, 4),
-                'life': random.randint(10, 18),
-                'color': color
-            })
+        global_particles.emit(8, self.rect.centerx, self.rect.centery,
+                              dx=(-2, 2), dy=(-2, 2), size=(2, 4), life=(10, 18),
+                              colors=DEBRIS_COLORS)
 
     def init_death_effect(self):
         if self.dead:
@@ -269,15 +983,9 @@ class Player:
         self.death_animation_complete = False
         self.death_complete = False
 
-        for _ in range(20):
-            self.death_particles.append({
-                'x': self.rect.centerx,
-                'y': self.rect.centery,
-                'dx': random.uniform(-3, 3),
-                'dy': random.uniform(-3, 3),
-                'size': random.randint(2, 5),
-                'life': random.randint(20, 40)
-            })
+        global_particles.emit(20, self.rect.centerx, self.rect.centery,
+                              dx=(-3, 3), dy=(-3, 3), size=(2, 5), life=(20, 40),
+                              colors=FIRE_COLORS)
 
     def update_death_effect(self):
         if not self.death_animation:
@@ -285,13 +993,6 @@ class Player:
             
         self.death_timer -= 1
         
-        for p in self.death_particles[:]:
-            p['x'] += p['dx']
-            p['y'] += p['dy'] 
-            p['life'] -= 1
-            if p['life'] <= 0:
-                self.death_particles.remove(p)
-        
         if self.death_timer <= 0:
             self.death_animation_complete = True
             self.death_complete = True
@@ -299,28 +1000,6 @@ class Player:
             
         return False
 
-    def draw_death_effect(self, surface):
-        if self.death_animation:
-            for p in self.death_particles:
-                pygame.draw.circle(surface, 
-                                (255, random.randint(100, 200), 0),
-                                (int(p['x']), int(p['y'])),
-                                p['size'])
-
-    def update_hit_particles(self):
-        for p in self.hit_particles[:]:
-            p['x'] += p['dx']
-            p['y'] += p['dy']
-            p['life'] -= 1
-            if p['life'] <= 0:
-                self.hit_particles.remove(p)
-
-    def draw_hit_particles(self, surface):
-        for p in self.hit_particles:
-            pygame.draw.circle(surface, p['color'], 
-                            (int(p['x']), int(p['y'])), 
-                            p['size'])
-
     def get_damage_state(self):
         health_pct = self.health / self.max_health  
         if health_pct > 0.75:
@@ -387,52 +1066,24 @@ class Player:
             self.hit_flash -= 1
             if self.hit_flash == 0:
                 self.invulnerable = False
-        
-        self.update_hit_particles()
-
-        if self.health <= self.max_health * 0.5 and not self.dead and random.random() < 0.2:
-            self.hit_particles.append({
-                'x': self.rect.centerx - 10,
-                'y': self.rect.centery,
-                'dx': random.uniform(-1, -0.5),
-                'dy': random.uniform(-1, -0.3),
-                'size': random.randint(2, 4),
-                'life': random.randint(20, 40),
-                'color': (random.randint(50, 100), random.randint(50, 100), random.randint(50, 100))
-            })
+
+        if self.health <= self.max_health * 0.5 and not self.dead and sim_rng.random() < 0.2:
+            global_particles.emit(1, self.rect.centerx - 10, self.rect.centery,
+                                  dx=(-1, -0.5), dy=(-1, -0.3), size=(2, 4), life=(20, 40),
+                                  colors=SMOKE_COLORS)
         
         return False
 
     def draw(self, surface):
         if self.img and not self.death_animation:
-            damage_state = self.get_damage_state()
-            plane_img = self.img.copy()
-            
-            if damage_state >= 1:
-                for _ in range(3):
-                    start_pos = (random.randint(5, 45), random.randint(5, 25))
-                    end_pos = (start_pos[0] + random.randint(-10, 10), 
-                            start_pos[1] + random.randint(-10, 10))
-                    pygame.draw.line(plane_img, (80, 80, 80), start_pos, end_pos, 1)
-            
-            if damage_state >= 2:
-                for _ in range(2):
-                    hole_pos = (random.randint(5, 45), random.randint(5, 25))
-                    pygame.draw.circle(plane_img, (0, 0, 0), hole_pos, random.randint(1, 2))
-                    pygame.draw.circle(plane_img, (150, 150, 150), hole_pos, random.randint(1, 2), 1)
-            
-            if damage_state >= 3:
-                for _ in range(2):
-                    effect_pos = (random.randint(0, 10), random.randint(5, 25))
-                    if random.random() > 0.5:
-                        pygame.draw.circle(plane_img, (100, 100, 100, 150), effect_pos, random.randint(2, 3))
-                    else:
-                        pygame.draw.circle(plane_img, (255, random.randint(100, 150), 0), effect_pos, random.randint(1, 2))
+            variants = get_damage_variants(self.img, self.get_damage_state())
+            # Cycle through the pre-baked variants so damage still flickers a little
+            plane_img = variants[sim_clock.get_ticks() // 125 % len(variants)]
             
             angle = -self.vel_y * 2
             original_rect = plane_img.get_rect(center=(self.x + plane_img.get_width()//2, 
                                                 self.y + plane_img.get_height()//2))
-            rotated_img = pygame.transform.rotate(plane_img, angle)
+            rotated_img = rotation_cache.get(plane_img, angle)
             rotated_rect = rotated_img.get_rect(center=original_rect.center)
             surface.blit(rotated_img, rotated_rect.topleft)
             
@@ -464,192 +1115,723 @@ class Player:
             flash_surf = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
             flash_surf.fill((255, 255, 255, 150))
             surface.blit(flash_surf, (self.rect.x, self.rect.y))
-        
-        self.draw_hit_particles(surface)
-        
-        if self.death_animation:
-            self.draw_death_effect(surface)
 
-class Bullet:
-    def __init__(self, x, y, is_player, damage=1):
-        self.x = x
-        self.y = y
-        self.img = bullet_img
+DAMAGE_VARIANT_COUNT = 4
+damage_variant_cache = {}
+
+def paint_damage(img, damage_state):
+    """Copy of img with cracks, holes and fire painted on for the damage state"""
+    plane_img = img.copy()
+
+    if damage_state >= 1:
+        for _ in range(3):
+            start_pos = (random.randint(5, 45), random.randint(5, 25))
+            end_pos = (start_pos[0] + random.randint(-10, 10), 
+                    start_pos[1] + random.randint(-10, 10))
+            pygame.draw.line(plane_img, (80, 80, 80), start_pos, end_pos, 1)
+    
+    if damage_state >= 2:
+        for _ in range(2):
+            hole_pos = (random.randint(5, 45), random.randint(5, 25))
+            pygame.draw.circle(plane_img, (0, 0, 0), hole_pos, random.randint(1, 2))
+            pygame.draw.circle(plane_img, (150, 150, 150), hole_pos, random.randint(1, 2), 1)
+    
+    if damage_state >= 3:
+        for _ in range(2):
+            effect_pos = (random.randint(0, 10), random.randint(5, 25))
+            if random.random() > 0.5:
+                pygame.draw.circle(plane_img, (100, 100, 100, 150), effect_pos, random.randint(2, 3))
+            else:
+                pygame.draw.circle(plane_img, (255, random.randint(100, 150), 0), effect_pos, random.randint(1, 2))
+
+    return plane_img
+
+def get_damage_variants(img, damage_state):
+    """Damage variants of img, generated on first use and reused afterwards"""
+    if damage_state == 0:
+        return (img,)
+    key = (img, damage_state)
+    variants = damage_variant_cache.get(key)
+    if variants is None:
+        variants = tuple(paint_damage(img, damage_state)
+                         for _ in range(DAMAGE_VARIANT_COUNT))
+        damage_variant_cache[key] = variants
+    return variants
+
+# Entity-component core. A component is a named group of columns, and an
+# entity class lists the components it has. Every entity of one class in
+# one group (enemies, player shots or enemy shots) is a row of one
+# Archetype store. Systems are plain functions over one store's columns,
+# run on every store in a group whose class has the components they need,
+# so behaviour comes from which components a class has rather than from
+# type checks in the game loop.
+COMPONENTS = {
+    "position": {"x": float, "y": float, "prev_x": float, "prev_y": float},
+    "velocity": {"speed_x": float, "speed_y": float},
+    "drift": {"drift_x": float},
+    "health": {"health": int, "max_health": int},
+    "weapon": {"shoot_cooldown": int, "fire_min_x": float, "fire_max_x": float,
+               "fire_range_y": float},
+    "stop_at": {"stop_x": float},
+    "bounce": {"vertical_speed": float, "direction": int},
+    "steering": {"base_speed": float, "angle": float, "target_angle": float,
+                 "angle_change_timer": int, "angle_change_delay": int},
+    "homing": {"base_speed": float, "direction_change_delay": int, "last_direction_change": int},
+    "seeker": {"speed": float, "target": int, "target_x": float, "target_y": float},
+    "lifetime": {"expires_at": int},
+    "spin": {"rotation_angle": float, "rotation_speed": float},
+    "bounds": {"min_x": float, "max_x": float, "min_y": float, "max_y": float,
+               "exclusive_max": bool},
+}
+
+class Column:
+    """An entity attribute kept in its Archetype's column instead of on the object"""
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        return getattr(entity.store, self.name).item(entity.slot)
+
+    def __set__(self, entity, value):
+        getattr(entity.store, self.name)[entity.slot] = value
+
+class Archetype:
+    """Every entity of one class in one group, as NumPy columns.
+
+    Rows stay dense: removing an entity moves the last one into its slot,
+    and a new entity's row starts zeroed.
+    """
+    def __init__(self, cls, group, queries, capacity=16):
+        self.cls = cls
+        self.group = group
+        self.members = []
+        self.live = None  # Cached view of the live rows
+        self.queries = queries  # The world's cached queries over this group
+        self._allocate(capacity)
+
+    def _changed(self):
+        """Drop everything cached about the live rows after they changed"""
+        self.live = None
+        self.queries.clear()
+
+    def _allocate(self, capacity):
+        for name, dtype in self.cls.columns.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, entity):
+        slot = len(self.members)
+        capacity = len(self.x)
+        if slot == capacity:
+            old = {name: getattr(self, name) for name in self.cls.columns}
+            self._allocate(capacity * 2)
+            for name, column in old.items():
+                getattr(self, name)[:slot] = column
+        for name in self.cls.columns:
+            getattr(self, name)[slot] = 0
+        self.members.append(entity)
+        self._changed()
+        entity.store = self
+        entity.slot = slot
+
+    def remove(self, entity):
+        slot = entity.slot
+        last = self.members.pop()
+        if last is not entity:
+            end = len(self.members)
+            for name in self.cls.columns:
+                column = getattr(self, name)
+                column[slot] = column[end]
+            self.members[slot] = last
+            last.slot = slot
+        self._changed()
+        entity.store = None
+
+    def clear(self):
+        for entity in self.members:
+            entity.store = None
+        self.members = []
+        self._changed()
+
+    def view(self):
+        """The live rows of every column; systems must update them in place"""
+        if self.live is None:
+            n = len(self.members)
+            self.live = SimpleNamespace(**{name: getattr(self, name)[:n]
+                                           for name in self.cls.columns})
+        return self.live
+
+class World:
+    """Every simulated entity, in one Archetype per (class, group).
+
+    Entities join when they are reset and leave when released to the pool.
+    Like global_particles, the world is shared, so Game.reset_game clears it.
+    """
+    def __init__(self):
+        self.stores = {}
+        # group -> {components: query result}, cleared whenever a store in the group changes
+        self.queries = {}
+        self.spawned = 0  # Serial numbers, which order entities as they were spawned
+
+    def __len__(self):
+        return sum(len(store) for store in self.stores.values())
+
+    def join(self, entity, group):
+        key = (type(entity), group)
+        store = self.stores.get(key)
+        if store is None:
+            queries = self.queries.setdefault(group, {})
+            store = self.stores[key] = Archetype(type(entity), group, queries)
+        self.spawned += 1
+        entity.serial = self.spawned
+        store.add(entity)
+
+    def query(self, group, *components):
+        """(store, columns) for each non-empty store in group whose class has all the components.
+
+        Results are cached until a store in the group gains or loses an
+        entity, so callers must not modify the returned list.
+        """
+        queries = self.queries.setdefault(group, {})
+        found = queries.get(components)
+        if found is None:
+            found = queries[components] = [
+                (store, store.view()) for store in self.stores.values()
+                if (store.group == group and store.members
+                    and store.cls.component_set.issuperset(components))]
+        return found
+
+    def clear(self):
+        for store in self.stores.values():
+            store.clear()
+
+    def save_positions(self):
+        """Keep every position as the previous tick's, for interpolated drawing"""
+        for store in self.stores.values():
+            if store.members:
+                c = store.view()
+                c.prev_x[:] = c.x
+                c.prev_y[:] = c.y
+
+    @contextlib.contextmanager
+    def interpolated(self, alpha):
+        """Blend every position between the previous tick and this one until exit"""
+        saved = []
+        for store in self.stores.values():
+            if store.members:
+                c = store.view()
+                saved.append((c, c.x.copy(), c.y.copy()))
+                c.x[:] = c.prev_x + (c.x - c.prev_x) * alpha
+                c.y[:] = c.prev_y + (c.y - c.prev_y) * alpha
+        try:
+            yield
+        finally:
+            for c, x, y in saved:
+                c.x[:] = x
+                c.y[:] = y
+
+world = World()
+
+class Entity:
+    """Base for everything simulated through the world.
+
+    Subclasses list their `components`; each column of those components
+    becomes an attribute that reads and writes the entity's row.
+    """
+    components = ()
+    draw_columns = ()  # The columns draw() takes after the surface, see draw_system
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.component_set = frozenset(cls.components)
+        cls.columns = {}
+        for component in cls.components:
+            cls.columns.update(COMPONENTS[component])
+        for name in cls.columns:
+            setattr(cls, name, Column(name))
+
+    def __init__(self, *args, **kwargs):
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.store = None
+        self.reset(*args, **kwargs)
+
+    def join(self, group):
+        """Take a fresh row in the world; reset() does this before setting any column"""
+        self.retire()
+        world.join(self, group)
+
+    def retire(self):
+        """Leave the world; called by the pool on release"""
+        if self.store is not None:
+            self.store.remove(self)
+
+    def set_bounds(self, min_x=-math.inf, max_x=math.inf, min_y=-math.inf, max_y=math.inf,
+                   exclusive_max=False):
+        """The area the entity lives in; it is removed once it leaves.
+
+        Bounds are inclusive unless exclusive_max is set, in which case
+        reaching max_x or max_y already counts as leaving.
+        """
+        self.min_x, self.max_x, self.min_y, self.max_y = min_x, max_x, min_y, max_y
+        self.exclusive_max = exclusive_max
+
+class EntityArena:
+    """The live entities of one kind, in the order they were added.
+
+    remove() only leaves a tombstone, so it is O(1) and safe while
+    iterating, and the entity stays at the same position until compact()
+    drops every tombstone in one pass and hands the removed entities back
+    to the pool. The game compacts once per tick.
+
+    Each entity gets a handle, a generational index into the arena's slot
+    table, that stays valid across ticks and compactions and goes stale
+    once the entity is removed, even if the pool reuses the object.
+    """
+    SLOT_BITS = 32
+
+    def __init__(self):
+        self.order = []  # Entities by position, None where one was removed
+        self.slots = []  # Slot -> entity, None when free
+        self.generations = []  # Slot -> bumped each time the slot is freed
+        self.free_slots = []
+        self.removed = []  # Waiting for compact(), in the order they were removed
+        self.first_hole = None
+        self.live = 0
+
+    def __len__(self):
+        return self.live
+
+    def __iter__(self):
+        """The live entities in order"""
+        return filter(None, self.order)
+
+    def __getitem__(self, position):
+        """The entity at a position, or None if it was removed this tick"""
+        return self.order[position]
+
+    @property
+    def end(self):
+        """Position the next appended entity will take"""
+        return len(self.order)
+
+    def indexed(self):
+        """(position, entity) for the live entities"""
+        if self.first_hole is None:
+            return enumerate(self.order)
+        return ((i, entity) for i, entity in enumerate(self.order) if entity is not None)
+
+    def since(self, position):
+        """The live entities appended at or after position"""
+        return [entity for entity in self.order[position:] if entity is not None]
+
+    def append(self, entity):
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            slot = len(self.slots)
+            self.slots.append(None)
+            self.generations.append(1)  # Never 0, so a handle of 0 means none
+        self.slots[slot] = entity
+        entity.handle = self.generations[slot] << self.SLOT_BITS | slot
+        entity.arena_index = len(self.order)
+        self.order.append(entity)
+        self.live += 1
+
+    def extend(self, entities):
+        for entity in entities:
+            self.append(entity)
+
+    def get(self, handle):
+        """The entity a handle refers to, or None once it has been removed"""
+        slot = handle & ((1 << self.SLOT_BITS) - 1)
+        if slot < len(self.slots) and self.generations[slot] == handle >> self.SLOT_BITS:
+            return self.slots[slot]
+        return None
+
+    def remove(self, entity):
+        position = entity.arena_index
+        if self.order[position] is not entity:
+            return  # Already removed this tick
+        self.order[position] = None
+        if self.first_hole is None or position < self.first_hole:
+            self.first_hole = position
+        slot = entity.handle & ((1 << self.SLOT_BITS) - 1)
+        self.slots[slot] = None
+        self.generations[slot] += 1
+        self.free_slots.append(slot)
+        self.removed.append(entity)
+        self.live -= 1
+
+    def remove_all(self, entities):
+        for entity in entities:
+            self.remove(entity)
+
+    def compact(self):
+        """Close the gaps left by removals and release the removed entities"""
+        if self.first_hole is None:
+            return
+        pool.release_all(self.removed)
+        self.removed.clear()
+        first = self.first_hole
+        tail = [entity for entity in self.order[first:] if entity is not None]
+        for position, entity in enumerate(tail, first):
+            entity.arena_index = position
+        del self.order[first:]
+        self.order.extend(tail)
+        self.first_hole = None
+
+    def clear(self):
+        """Remove and release everything"""
+        self.remove_all(list(self))
+        self.compact()
+
+# Systems, each run over the columns of one store. Every group's update
+# makes a single pass over its stores and runs the systems whose
+# components the store's class has, so a store pays for one query per
+# tick rather than one per system.
+
+# Stores with fewer rows than this take the plain Python path in the
+# systems that have one: on a handful of rows NumPy's per-call overhead
+# costs more than the loop it saves. The stores in bench.py's level and
+# endless_dense scenarios stay below it; max_fire_rate's player shots and
+# homing_swarm's missiles go well above it.
+SCALAR_ROWS = 24
+
+def move_system(store, c):
+    c.x += c.speed_x
+    c.y += c.speed_y
+
+def drift_system(store, c):
+    c.x += c.drift_x
+
+def stop_system(store, c):
+    """Entities flying in halt once they reach stop_x"""
+    c.speed_x[c.x <= c.stop_x] = 0
+
+def bounce_system(store, c):
+    """Halted entities bounce up and down between the top and bottom of the screen"""
+    if len(store) < SCALAR_ROWS:
+        rows = list(zip(c.speed_x.tolist(), c.y.tolist(), c.vertical_speed.tolist(),
+                        c.direction.tolist()))
+        directions = [-direction if speed_x == 0 and (y <= 0 or y >= HEIGHT - 30) else direction
+                      for speed_x, y, _, direction in rows]
+        c.direction[:] = directions
+        c.speed_y[:] = [vertical_speed * direction if speed_x == 0 else 0
+                        for (speed_x, _, vertical_speed, _), direction in zip(rows, directions)]
+        return
+    bouncing = c.speed_x == 0
+    c.direction[bouncing & ((c.y <= 0) | (c.y >= HEIGHT - 30))] *= -1
+    c.speed_y[:] = np.where(bouncing, c.vertical_speed * c.direction, 0)
+
+def steering_system(store, c):
+    """Ease towards a target angle, slowing down while turning, and retarget now and then"""
+    # Retargeting draws from sim_rng, so only the few due for it go through Python
+    c.angle_change_timer += 1
+    for i in np.flatnonzero(c.angle_change_timer >= c.angle_change_delay).tolist():
+        store.members[i].set_new_angle()
+        store.members[i].angle_change_delay = sim_rng.randint(180, 240)
+
+    angle_diff = c.target_angle - c.angle
+    turning = np.abs(angle_diff) > 0.5
+    c.angle += np.where(turning, angle_diff * 0.05, 0)
+    speed = np.where(turning, c.base_speed * 0.8, c.base_speed)
+    rad_angle = np.radians(c.angle)
+    c.speed_x[:] = -speed * np.cos(rad_angle)
+    c.speed_y[:] = speed * np.sin(rad_angle)
+
+def lane_system(store, c):
+    """Keep steering entities in the middle band of the screen, retargeting at its edges"""
+    low, high = c.y < HEIGHT * 0.2, c.y > HEIGHT * 0.8
+    c.y[low] = HEIGHT * 0.2
+    c.y[high] = HEIGHT * 0.8
+    for i in np.flatnonzero(low | high).tolist():
+        store.members[i].set_new_angle()
+
+def homing_system(store, c, target_x, target_y, now):
+    """Turn towards the target, at most once per direction_change_delay milliseconds"""
+    if len(store) < SCALAR_ROWS:
+        for i, (x, y, last_change, delay, base_speed) in enumerate(zip(
+                c.x.tolist(), c.y.tolist(), c.last_direction_change.tolist(),
+                c.direction_change_delay.tolist(), c.base_speed.tolist())):
+            if now - last_change > delay:
+                dx = target_x - x
+                dy = target_y - y
+                distance = max(1, math.sqrt(dx**2 + dy**2))
+                c.speed_x[i] = dx / distance * base_speed
+                c.speed_y[i] = dy / distance * base_speed
+                c.last_direction_change[i] = now
+        return
+    turning = now - c.last_direction_change > c.direction_change_delay
+    if not turning.any():
+        return
+    dx = target_x - c.x[turning]
+    dy = target_y - c.y[turning]
+    distance = np.maximum(1, np.sqrt(dx**2 + dy**2))
+    c.speed_x[turning] = dx / distance * c.base_speed[turning]
+    c.speed_y[turning] = dy / distance * c.base_speed[turning]
+    c.last_direction_change[turning] = now
+
+def seeker_system(store, c, targets):
+    """Steer towards the closest target, keeping the current heading if there is none.
+
+    Classes with sticky_target stay on the target they have while it is alive.
+    """
+    if not len(targets):
+        return
+    rows = targets.nearest_rows(c.x, c.y)
+    if store.cls.sticky_target:
+        kept = targets.rows_of(c.target)
+        rows = np.where(kept >= 0, kept, rows)
+    c.target[:] = targets.handles[rows]
+    c.target_x[:] = targets.x[rows]
+    c.target_y[:] = targets.y[rows]
+    dx = c.target_x - c.x
+    dy = c.target_y - c.y
+    distance = np.maximum(1, np.sqrt(dx*dx + dy*dy))
+    c.speed_x[:] = dx / distance * c.speed
+    c.speed_y[:] = dy / distance * c.speed
+
+def spin_system(store, c):
+    c.rotation_angle[:] = (c.rotation_angle + c.rotation_speed) % 360
+
+def cooldown_system(store, c):
+    if len(store) < SCALAR_ROWS:
+        c.shoot_cooldown[:] = [cooldown - 1 if cooldown > 0 else cooldown
+                               for cooldown in c.shoot_cooldown.tolist()]
+    else:
+        np.subtract(c.shoot_cooldown, 1, out=c.shoot_cooldown, where=c.shoot_cooldown > 0)
+
+def out_of_bounds(c):
+    over = np.where(c.exclusive_max, (c.x >= c.max_x) | (c.y >= c.max_y),
+                    (c.x > c.max_x) | (c.y > c.max_y))
+    return (c.x < c.min_x) | (c.y < c.min_y) | over
+
+def out_of_bounds_scalar(c):
+    """out_of_bounds as a list of bools, for stores below SCALAR_ROWS"""
+    return [x < min_x or y < min_y or
+            (x >= max_x or y >= max_y if exclusive_max else x > max_x or y > max_y)
+            for x, y, min_x, max_x, min_y, max_y, exclusive_max in
+            zip(c.x.tolist(), c.y.tolist(), c.min_x.tolist(), c.max_x.tolist(),
+                c.min_y.tolist(), c.max_y.tolist(), c.exclusive_max.tolist())]
+
+def ready_to_fire(c, player):
+    """Loaded, inside the firing window and within vertical range of the player"""
+    return ((c.shoot_cooldown <= 0) & (c.x >= c.fire_min_x) & (c.x <= c.fire_max_x) &
+            (np.abs(player.y - c.y) < c.fire_range_y))
+
+def ready_to_fire_scalar(c, player):
+    """ready_to_fire as a list of bools, for stores below SCALAR_ROWS"""
+    player_y = player.y
+    return [cooldown <= 0 and fire_min_x <= x <= fire_max_x and abs(player_y - y) < fire_range_y
+            for cooldown, x, y, fire_min_x, fire_max_x, fire_range_y in
+            zip(c.shoot_cooldown.tolist(), c.x.tolist(), c.y.tolist(), c.fire_min_x.tolist(),
+                c.fire_max_x.tolist(), c.fire_range_y.tolist())]
+
+def place_system(store, c, gone):
+    """Move each collision rect to its entity's position and add the entities that left their bounds to gone"""
+    members = store.members
+    if len(members) < SCALAR_ROWS:
+        for entity, x, y, off in zip(members, c.x.tolist(), c.y.tolist(), out_of_bounds_scalar(c)):
+            entity.rect.topleft = (x, y)
+            if off:
+                gone.append(entity)
+        return
+    for entity, x, y in zip(members, c.x.tolist(), c.y.tolist()):
+        entity.rect.topleft = (x, y)
+    gone.extend(members[i] for i in np.flatnonzero(out_of_bounds(c)).tolist())
+
+def lifetime_system(store, c, now, expired):
+    """Add the entities whose lifetime ran out to expired"""
+    if len(store) < SCALAR_ROWS:
+        expired.extend(entity for entity, expires_at in zip(store.members, c.expires_at.tolist())
+                       if now > expires_at)
+    else:
+        expired.extend(store.members[i] for i in np.flatnonzero(now > c.expires_at).tolist())
+
+def draw_system(group, surface):
+    """Draw a group in spawn order, so overlapping sprites stack as they always have.
+
+    Each store reads the columns its class lists in draw_columns once, as
+    Python lists, and hands every entity its own values, instead of each
+    draw() reading its columns one attribute at a time.
+    """
+    draws = []
+    for store, c in world.query(group):
+        columns = [getattr(c, name).tolist() for name in store.cls.draw_columns]
+        draws.extend(zip(store.members, *columns))
+    draws.sort(key=lambda draw: draw[0].serial)
+    for entity, *values in draws:
+        entity.draw(surface, *values)
+
+def enemy_steps(store, c, player, steps):
+    """Add the enemies that need a Python step this tick to steps.
+
+    Adds (serial, enemy, smoking, off_screen, ready) for each enemy that
+    trails smoke, left the screen or is ready to fire; sorting steps puts
+    them in spawn order. Also moves every enemy's collision rect to its
+    position, as place_system does for shots.
+    """
+    members = store.members
+    if len(members) < SCALAR_ROWS:
+        smokes, trails = store.cls.smokes, store.cls.trails
+        for enemy, x, y, health, max_health, off, fire in zip(
+                members, c.x.tolist(), c.y.tolist(), c.health.tolist(), c.max_health.tolist(),
+                out_of_bounds_scalar(c), ready_to_fire_scalar(c, player)):
+            enemy.rect.topleft = (x, y)
+            smoke = smokes and health <= max_health * 0.5
+            if trails or smoke or off or fire:
+                steps.append((enemy.serial, enemy, smoke, off, fire))
+        return
+    for enemy, x, y in zip(members, c.x.tolist(), c.y.tolist()):
+        enemy.rect.topleft = (x, y)
+    ready = ready_to_fire(c, player)
+    gone = out_of_bounds(c)
+    if store.cls.smokes:
+        smoking = c.health <= c.max_health * 0.5
+    else:
+        smoking = np.zeros_like(gone)
+    if store.cls.trails:
+        rows = np.arange(len(store))
+    else:
+        rows = np.flatnonzero(ready | gone | smoking)
+    steps.extend((members[i].serial, members[i], smoke, off, fire) for i, smoke, off, fire in
+                 zip(rows.tolist(), smoking[rows].tolist(), gone[rows].tolist(),
+                     ready[rows].tolist()))
+
+class Bullet(Entity):
+    components = ("position", "velocity", "bounds")
+
+    def reset(self, x, y, is_player, damage=1):
+        self.join("player_shots" if is_player else "enemy_shots")
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
+        self.img = bullet_img if is_player else enemy_bullet_img
         self.is_player = is_player
         self.damage = damage
-        self.rect = pygame.Rect(x, y, 8, 4)
+        self.rect.update(x, y, 8, 4)
         self.speed_x = 10 if is_player else -7
         self.speed_y = 0
+        if is_player:
+            self.set_bounds(max_x=WIDTH)
+        else:
+            self.set_bounds(min_x=0)
 
-        if not is_player:
-            self.img = pygame.transform.flip(self.img, True, False)
-        
-    def update(self):
-        self.x += self.speed_x
-        self.y += self.speed_y
-        self.rect.x = self.x
-        self.rect.y = self.y
+    draw_columns = ("x", "y", "speed_x", "speed_y")
 
-    def draw(self):
+    def draw(self, surface, x, y, speed_x, speed_y):
         if self.img:
-            if self.speed_y != 0:
-                angle = math.degrees(math.atan2(-self.speed_y, abs(self.speed_x)))
-                rotated_img = pygame.transform.rotate(self.img, angle)
-                screen.blit(rotated_img, (self.x, self.y))
+            if speed_y != 0:
+                angle = math.degrees(math.atan2(-speed_y, abs(speed_x)))
+                rotated_img = rotation_cache.get(self.img, angle)
+                surface.blit(rotated_img, (x, y))
             else:
-                screen.blit(self.img, (self.x, self.y))
+                surface.blit(self.img, (x, y))
         else:
-            pygame.draw.rect(screen, (0, 255, 0), (self.x, self.y, 10, 5))
+            pygame.draw.rect(surface, (0, 255, 0), (x, y, 10, 5))
 
 class PlayerHomingMissile(Bullet):
-    def __init__(self, x, y, target_x, target_y):
-        super().__init__(x, y, True, damage=30)
+    components = Bullet.components + ("seeker",)
+    sticky_target = False  # True to chase the first target to the end instead of the closest one
+
+    def reset(self, x, y, target):
+        super().reset(x, y, True, damage=30)
         self.img = homing_missile_img
         self.speed = 9  # Faster than regular bullets
-        self.target_x = target_x
-        self.target_y = target_y
-        self.rect = pygame.Rect(x, y, 15, 5)
-        
-    def update(self, enemies):
-        # Find closest enemy if we don't have a target
-        closest_enemy = None
-        min_distance = float('inf')
-        
-        for enemy in enemies:
-            if not enemy.dead:
-                dist = math.sqrt((enemy.rect.centerx - self.x)**2 + 
-                                (enemy.rect.centery - self.y)**2)
-                if dist < min_distance:
-                    min_distance = dist
-                    closest_enemy = enemy
-        
-        if closest_enemy:
-            self.target_x = closest_enemy.rect.centerx
-            self.target_y = closest_enemy.rect.centery
-            
-            # Calculate direction to target
-            dx = self.target_x - self.x
-            dy = self.target_y - self.y
-            dist = max(1, math.sqrt(dx*dx + dy*dy))
-            
-            # Normalize and apply speed
-            self.speed_x = (dx / dist) * self.speed
-            self.speed_y = (dy / dist) * self.speed
-        
-        # Update position
-        self.x += self.speed_x
-        self.y += self.speed_y
-        self.rect.x = self.x
-        self.rect.y = self.y
-        
-        # Remove if off-screen
-        if (self.x < -50 or self.x > WIDTH + 50 or 
-            self.y < -50 or self.y > HEIGHT + 50):
-            return False
-            
-        return True
-        
-    def draw(self):
+        self.target = target.handle
+        self.target_x = target.rect.centerx
+        self.target_y = target.rect.centery
+        self.rect.update(x, y, 15, 5)
+        self.set_bounds(-50, WIDTH + 50, -50, HEIGHT + 50)
+
+    def draw(self, surface, x, y, speed_x, speed_y):
         if self.img:
-            angle = math.degrees(math.atan2(self.speed_y, self.speed_x))
-            rotated_img = pygame.transform.rotate(self.img, -angle)
-            screen.blit(rotated_img, (self.x, self.y))
+            angle = math.degrees(math.atan2(speed_y, speed_x))
+            rotated_img = rotation_cache.get(self.img, -angle)
+            surface.blit(rotated_img, (x, y))
         else:
-            pygame.draw.rect(screen, (0, 255, 255), (self.x, self.y, 15, 5))  # Cyan for player missiles
+            pygame.draw.rect(surface, (0, 255, 255), (x, y, 15, 5))  # Cyan for player missiles
 
 class EnemyHomingMissile(Bullet):
-    def __init__(self, x, y, target_x, target_y):
-        super().__init__(x, y, False, damage=20)
+    components = ("position", "velocity", "drift", "homing", "lifetime", "bounds")
+
+    def reset(self, x, y, target_x, target_y):
+        super().reset(x, y, False, damage=20)
         self.img = homing_missile_img
         self.base_speed = 3
-        self.target_x = target_x
-        self.target_y = target_y
-        self.angle = 0
-        self.creation_time = pygame.time.get_ticks()
-        self.lifespan = 5000
-        self.last_direction_change = 0
+        creation_time = sim_clock.get_ticks()
+        self.expires_at = creation_time + 5000
         self.direction_change_delay = 200
-        self.current_dx = -1
-        self.current_dy = 0
-        
-    def update(self, player_x, player_y):
-        self.target_x = player_x
-        self.target_y = player_y
-        
-        if pygame.time.get_ticks() - self.creation_time > self.lifespan:
-            return False
-        
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_direction_change > self.direction_change_delay:
-            dx = self.target_x - self.x
-            dy = self.target_y - self.y
-            distance = max(1, (dx**2 + dy**2)**0.5)
-            self.current_dx = dx / distance
-            self.current_dy = dy / distance
-            self.last_direction_change = current_time
-        
-        self.x += self.current_dx * self.base_speed
-        self.y += self.current_dy * self.base_speed
-        self.x -= 1.5  # Always drift left slightly
-        
-        self.rect.x = self.x
-        self.rect.y = self.y
-        return True
-        
-    def draw(self):
+        self.last_direction_change = creation_time - self.direction_change_delay - 1
+        self.speed_x = -self.base_speed
+        self.speed_y = 0
+        self.drift_x = -1.5  # Always drift left slightly
+        self.set_bounds(-50, WIDTH + 50, -50, HEIGHT + 50)
+
+    def draw(self, surface, x, y, speed_x, speed_y):
         if self.img:
-            angle = math.degrees(math.atan2(self.current_dy, self.current_dx))
-            rotated_img = pygame.transform.rotate(self.img, -angle)
-            screen.blit(rotated_img, (self.x, self.y))
+            angle = math.degrees(math.atan2(speed_y, speed_x))
+            rotated_img = rotation_cache.get(self.img, -angle)
+            surface.blit(rotated_img, (x, y))
         else:
-            pygame.draw.rect(screen, (255, 0, 0), (self.x, self.y, 10, 5))
+            pygame.draw.rect(surface, (255, 0, 0), (x, y, 10, 5))
 
 class Bomb(Bullet):
-    def __init__(self, x, y):
-        super().__init__(x, y, False, damage=30)
-        self.img = pygame.transform.rotate(bullet_img, -90)
+    components = Bullet.components + ("spin",)
+
+    def reset(self, x, y):
+        super().reset(x, y, False, damage=30)
+        self.img = bomb_img
         self.speed_x = -0.5
         self.speed_y = 4
-        self.rect = pygame.Rect(x, y, 10, 15)
+        self.rect.update(x, y, 10, 15)
         self.rotation_angle = 0
         self.rotation_speed = 0
+        self.set_bounds(max_y=HEIGHT, exclusive_max=True)  # Gone once it reaches the bottom edge
 
-    def update(self):
-        self.x += self.speed_x
-        self.y += self.speed_y
-        self.rotation_angle = (self.rotation_angle + self.rotation_speed) % 360
-        self.rect.x = self.x
-        self.rect.y = self.y
-        return self.y < HEIGHT  # Remove when below screen
-
-    def draw(self):
-        rotated_img = pygame.transform.rotate(self.img, self.rotation_angle)
-        rect = rotated_img.get_rect(center=(self.x + self.img.get_width()/2, 
-                                        self.y + self.img.get_height()/2))
-        screen.blit(rotated_img, rect.topleft)
-
-class Enemy:
-    def __init__(self, x, y, enemy_type, max_health=10):
-        self.x = x
-        self.y = y
+    draw_columns = ("x", "y", "rotation_angle")
+
+    def draw(self, surface, x, y, rotation_angle):
+        rotated_img = rotation_cache.get(self.img, rotation_angle)
+        rect = rotated_img.get_rect(center=(x + self.img.get_width()/2, 
+                                        y + self.img.get_height()/2))
+        surface.blit(rotated_img, rect.topleft)
+
+class Enemy(Entity):
+    """Base enemy: flies in a straight line and shoots when its weapon is loaded.
+
+    Enemy types differ in their components and in what fire() launches.
+    """
+    components = ("position", "velocity", "health", "weapon", "bounds")
+    draw_columns = ("x", "y", "health", "max_health")
+    smokes = True  # Trail smoke when badly damaged
+    trails = False  # Needs emit_trail() every tick, not only while smoking
+
+    def reset(self, x, y, enemy_type, max_health=10):
+        self.join("enemies")
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
         self.img = enemy_img
         self.type = enemy_type
         self.max_health = max_health
         self.health = max_health
         self.dead = False
-        self.death_particles = []
-        self.hit_particles = []
-        self.rect = pygame.Rect(x, y, 50, 30)
-        self.shoot_cooldown = random.randint(30, 90)  # Original cooldown range
-        
-    def draw_health_bar(self, surface):
-        if self.health < self.max_health:
+        self.rect.update(x, y, 50, 30)
+        self.shoot_cooldown = sim_rng.randint(30, 90)  # Original cooldown range
+        self.fire_min_x, self.fire_max_x, self.fire_range_y = -math.inf, math.inf, math.inf
+        self.set_bounds(min_x=-100, max_x=WIDTH + 100)
+
+    def draw_health_bar(self, surface, x, y, health, max_health):
+        if health < max_health:
             bar_width = 40
             bar_height = 4
-            outline_rect = pygame.Rect(self.x, self.y - 8, bar_width, bar_height)
-            fill_rect = pygame.Rect(self.x, self.y - 8, bar_width * (self.health/self.max_health), bar_height)
+            outline_rect = pygame.Rect(x, y - 8, bar_width, bar_height)
+            fill_rect = pygame.Rect(x, y - 8, bar_width * (health/max_health), bar_height)
             
-            health_pct = self.health / self.max_health
+            health_pct = health / max_health
             if health_pct > 0.6:
                 color = (0, 255, 0)
             elif health_pct > 0.3:
@@ -661,193 +1843,122 @@ class Enemy:
             pygame.draw.rect(surface, color, fill_rect)
             pygame.draw.rect(surface, (100, 100, 100), outline_rect, 1)
 
-    def draw(self, surface):
+    def draw(self, surface, x, y, health, max_health):
         if self.img:
-            surface.blit(self.img, (self.x, self.y))
+            surface.blit(self.img, (x, y))
         else:
             pygame.draw.polygon(surface, (255, 50, 50),
-                               [(self.x, self.y+15), 
-                                (self.x+40, self.y), 
-                                (self.x+40, self.y+30)])
+                               [(x, y+15), 
+                                (x+40, y), 
+                                (x+40, y+30)])
         
-        self.draw_health_bar(surface)
+        self.draw_health_bar(surface, x, y, health, max_health)
         
-        if self.health < self.max_health:
-            damage_pct = 1 - (self.health / self.max_health)
+        if health < max_health:
+            damage_pct = 1 - (health / max_health)
             if damage_pct > 0.5:
                 for _ in range(int(2 * damage_pct)):
                     smoke_pos = (
-                        self.x + random.randint(0, self.rect.width),
-                        self.y + random.randint(0, self.rect.height)
+                        x + random.randint(0, self.rect.width),
+                        y + random.randint(0, self.rect.height)
                     )
                     pygame.draw.circle(surface, 
                                     (random.randint(80, 120), random.randint(80, 120), random.randint(80, 120)),
                                     smoke_pos, random.randint(1, 3))
-        
-        for p in self.hit_particles:
-            pygame.draw.circle(surface, p['color'], 
-                            (int(p['x']), int(p['y'])), 
-                            p['size'])
 
-    def update(self):
-        for p in self.hit_particles[:]:
-            p['life'] -= 1
-            if p['life'] <= 0:
-                self.hit_particles.remove(p)
-                
-        if self.shoot_cooldown > 0:
-            self.shoot_cooldown -= 1
-            
-        if self.health <= self.max_health * 0.5 and not self.dead and random.random() < 0.2:
-            self.hit_particles.append({
-                'x': self.rect.centerx - 10,
-                'y': self.rect.centery,
-                'dx': random.uniform(-1, -0.5),
-                'dy': random.uniform(-1, -0.3),
-                'size': random.randint(2, 4),
-                'life': random.randint(20, 40),
-                'color': (random.randint(50, 100), random.randint(50, 100), random.randint(50, 100))
-            })
+    def emit_trail(self, smoking):
+        # Smoke puffs stay where they were emitted, leaving a trail
+        if smoking and not self.dead and sim_rng.random() < 0.2:
+            global_particles.emit(1, self.rect.centerx - 10, self.rect.centery,
+                                  size=(2, 4), life=(20, 40), colors=SMOKE_COLORS)
+
+    def fire(self, player):
+        """Launch whatever this enemy shoots; called when ready_to_fire says so"""
+        return self.shoot()
 
-    def should_shoot(self, player=None):
-        return self.shoot_cooldown <= 0
-        
     def shoot(self, player=None):
-        self.shoot_cooldown = random.randint(30, 90)  # Original cooldown
-        if has_sound:
-            shoot_sound.play()
-        return Bullet(self.x, self.y + 15, False, damage=10)
+        self.shoot_cooldown = sim_rng.randint(30, 90)  # Original cooldown
+        voices.play("shoot")
+        return pool.acquire(Bullet, self.x, self.y + 15, False, damage=10)
 
     def create_death_particles(self):
-        for _ in range(15):
-            color = random.choice([
-                (255, 255, 100),
-                (255, 200, 50),
-                (200, 200, 200),
-                (120, 120, 120),
-                (255, 255, 255),
-                (100, 180, 255)
-            ])
-            self.death_particles.append({
-                'x': self.rect.centerx,
-                'y': self.rect.centery,
-                'dx': random.uniform(-2, 2),
-                'dy': random.uniform(-2, 2),
-                'size': random.randint(1, 4),
-                'life': random.randint(15, 30),
-                'color': color
-            })
+        global_particles.emit(15, self.rect.centerx, self.rect.centery,
+                              dx=(-2, 2), dy=(-2, 2), size=(1, 4), life=(15, 30),
+                              colors=DEBRIS_COLORS)
 
-    def draw_particles(self, surface):
-        for p in self.death_particles[:]:
-            pygame.draw.circle(surface, p['color'],
-                             (int(p['x']), int(p['y'])),
-                             p['size'])
-            p['x'] += p['dx']
-            p['y'] += p['dy']
-            p['life'] -= 1
-            if p['life'] <= 0:
-                self.death_particles.remove(p)
+    def create_hit_particles(self, x, y):
+        global_particles.emit(3, x, y, dx=(-1, 1), dy=(-1, 1), size=(1, 2), life=(5, 10),
+                              colors=FIRE_COLORS)
 
 class Enemy1(Enemy):
-    def __init__(self):
-        super().__init__(WIDTH, random.randint(50, HEIGHT - 50), 1, 10)
-        self.speed = 3  # Original speed was 3
-        
-    def update(self):
-        super().update()
-        self.x -= self.speed
-        self.rect.x = self.x
+    def reset(self):
+        super().reset(WIDTH, sim_rng.randint(50, HEIGHT - 50), 1, 10)
+        self.speed_x = -3  # Original speed was 3
 
 class Enemy2(Enemy):
-    def __init__(self):
-        super().__init__(WIDTH, random.randint(50, HEIGHT - 50), 2, 20)
+    components = Enemy.components + ("stop_at",)
+
+    def reset(self):
+        super().reset(WIDTH, sim_rng.randint(50, HEIGHT - 50), 2, 20)
         self.stop_x = WIDTH * 0.8
-        self.speed = 3  # Original speed
-        self.has_stopped = False
-        self.shoot_cooldown = random.randint(30, 90)  # Original cooldown
-        
-    def update(self):
-        super().update()
-        if not self.has_stopped:
-            self.x -= self.speed
-            if self.x <= self.stop_x:
-                self.has_stopped = True
-            self.rect.x = self.x
+        self.speed_x = -3  # Original speed
+        self.shoot_cooldown = sim_rng.randint(30, 90)  # Original cooldown
 
     def shoot(self):
-        self.shoot_cooldown = random.randint(70, 120)  # Original cooldown
-        if has_sound:
-            shoot_sound.play()
-        return Bullet(self.x, self.y + 15, False, damage=15)  # Original damage
+        self.shoot_cooldown = sim_rng.randint(70, 120)  # Original cooldown
+        voices.play("shoot")
+        return pool.acquire(Bullet, self.x, self.y + 15, False, damage=15)  # Original damage
 
 class Enemy3(Enemy):
-    def __init__(self):
-        super().__init__(WIDTH, random.randint(50, HEIGHT - 50), 3, 20)
+    components = Enemy.components + ("stop_at", "bounce")
+
+    def reset(self):
+        super().reset(WIDTH, sim_rng.randint(50, HEIGHT - 50), 3, 20)
         self.stop_x = WIDTH * 0.7
-        self.speed = 3  # Original speed
+        self.speed_x = -3  # Original speed
         self.vertical_speed = 1.5  # Original speed
         self.direction = 1
-        self.has_stopped = False
-        self.shoot_cooldown = random.randint(60, 100)  # Original cooldown
-        
-    def update(self):
-        super().update()
-        if not self.has_stopped:
-            self.x -= self.speed
-            if self.x <= self.stop_x:
-                self.has_stopped = True
-            self.rect.x = self.x
-        else:
-            self.y += self.vertical_speed * self.direction
-            if self.y <= 0 or self.y >= HEIGHT - 30:
-                self.direction *= -1
-            self.rect.y = self.y
+        self.shoot_cooldown = sim_rng.randint(60, 100)  # Original cooldown
 
     def shoot(self):
-        self.shoot_cooldown = random.randint(50, 100)  # Original cooldown
-        if has_sound:
-            shoot_sound.play()
-        return Bullet(self.x, self.y + 15, False, damage=10)  # Original damage
+        self.shoot_cooldown = sim_rng.randint(50, 100)  # Original cooldown
+        voices.play("shoot")
+        return pool.acquire(Bullet, self.x, self.y + 15, False, damage=10)  # Original damage
 
 class Enemy4(Enemy):
-    def __init__(self):
-        super().__init__(WIDTH, random.randint(50, HEIGHT - 50), 4, 20)
+    components = Enemy.components + ("stop_at",)
+
+    def reset(self):
+        super().reset(WIDTH, sim_rng.randint(50, HEIGHT - 50), 4, 20)
         self.stop_x = WIDTH * 0.9
-        self.speed = 3  # Original speed
+        self.speed_x = -3  # Original speed
         self.shoot_cooldown = 210  # Original 3.5 second delay
-        
-    def update(self):
-        super().update()
-        if self.x > self.stop_x:
-            self.x -= self.speed
-            self.rect.x = self.x
-            
-    def should_shoot(self, player):
-        return (super().should_shoot() and 
-                self.x <= self.stop_x and
-                abs(player.y - self.y) < HEIGHT/2)
-        
+        # Only fires once in position, at a player within half a screen vertically
+        self.fire_max_x = self.stop_x
+        self.fire_range_y = HEIGHT/2
+
+    def fire(self, player):
+        return self.shoot(player.x, player.y)
+
     def shoot(self, player_x, player_y):
         self.shoot_cooldown = 240  # Original 4 second cooldown
-        if has_sound:
-            shoot_sound.play()
-        missile = EnemyHomingMissile(self.x, self.y + 15, player_x, player_y)
+        voices.play("shoot")
+        missile = pool.acquire(EnemyHomingMissile, self.x, self.y + 15, player_x, player_y)
         missile.damage = 20  # Original damage
         return missile
 
 class Enemy5(Enemy):
-    def __init__(self):
-        super().__init__(WIDTH, random.randint(int(HEIGHT * 0.2), int(HEIGHT * 0.7)), 5, 10)
+    components = Enemy.components + ("steering",)
+    draw_columns = Enemy.draw_columns + ("angle",)
+    smokes = False
+
+    def reset(self):
+        super().reset(WIDTH, sim_rng.randint(int(HEIGHT * 0.2), int(HEIGHT * 0.7)), 5, 10)
         self.base_speed = 4
-        self.current_speed = self.base_speed
-        self.speed_x = -self.base_speed
-        self.speed_y = 0
         self.angle = 0
         self.target_angle = 0
         self.angle_change_timer = 0
-        self.angle_change_delay = random.randint(120, 210)
-        self.original_img = self.img.copy()  # Store original for rotation
+        self.angle_change_delay = sim_rng.randint(120, 210)
         self.set_new_angle()
 
     def set_new_angle(self):
@@ -855,331 +1966,1153 @@ class Enemy5(Enemy):
         max_angle = 25
         
         if self.y < HEIGHT * 0.3:
-            self.target_angle = random.randint(0, max_angle)
+            self.target_angle = sim_rng.randint(0, max_angle)
         elif self.y > HEIGHT * 0.7:
-            self.target_angle = random.randint(min_angle, 0)
+            self.target_angle = sim_rng.randint(min_angle, 0)
         else:
-            self.target_angle = random.randint(min_angle, max_angle)
+            self.target_angle = sim_rng.randint(min_angle, max_angle)
         
         self.angle_change_timer = 0
 
-    def update(self):
-        self.angle_change_timer += 1
-        if self.angle_change_timer >= self.angle_change_delay:
-            self.set_new_angle()
-            self.angle_change_delay = random.randint(180, 240)
-
-        angle_diff = self.target_angle - self.angle
-        if abs(angle_diff) > 0.5:
-            self.angle += angle_diff * 0.05
-            self.current_speed = self.base_speed * 0.8
-        else:
-            self.current_speed = self.base_speed
-
-        rad_angle = math.radians(self.angle)
-        self.speed_x = -self.current_speed * math.cos(rad_angle)
-        self.speed_y = self.current_speed * math.sin(rad_angle)
-
-        self.x += self.speed_x
-        self.y += self.speed_y
-
-        if self.y < HEIGHT * 0.2:
-            self.y = HEIGHT * 0.2
-            self.set_new_angle()
-        elif self.y > HEIGHT * 0.8:
-            self.y = HEIGHT * 0.8
-            self.set_new_angle()
-
-        self.rect.x = self.x
-        self.rect.y = self.y
-        
-        if self.shoot_cooldown > 0:
-            self.shoot_cooldown -= 1
-
-    def draw(self, screen):
+    def draw(self, screen, x, y, health, max_health, angle):
         if self.img:
-            rotated_img = pygame.transform.rotate(self.img, -self.angle)
+            rotated_img = rotation_cache.get(self.img, -angle)
             rotated_rect = rotated_img.get_rect()
-            rotated_rect.center = (self.x + self.img.get_width() // 2, 
-                                self.y + self.img.get_height() // 2)
+            rotated_rect.center = (x + self.img.get_width() // 2, 
+                                y + self.img.get_height() // 2)
             screen.blit(rotated_img, rotated_rect)
         else:
             pygame.draw.polygon(screen, (200, 50, 200),
-                            [(self.x, self.y+15), 
-                                (self.x+40, self.y), 
-                                (self.x+40, self.y+30)])
-        self.draw_health_bar(screen)
-        if self.health < self.max_health:
-            damage_pct = 1 - (self.health / self.max_health)
+                            [(x, y+15), 
+                                (x+40, y), 
+                                (x+40, y+30)])
+        self.draw_health_bar(screen, x, y, health, max_health)
+        if health < max_health:
+            damage_pct = 1 - (health / max_health)
             if damage_pct > 0.5:
                 for _ in range(int(2 * damage_pct)):
                     smoke_pos = (
-                        self.x + random.randint(0, self.rect.width),
-                        self.y + random.randint(0, self.rect.height)
+                        x + random.randint(0, self.rect.width),
+                        y + random.randint(0, self.rect.height)
                     )
                     pygame.draw.circle(screen, 
                                     (random.randint(80, 120), random.randint(80, 120), random.randint(80, 120)),
                                     smoke_pos, random.randint(1, 3))
 
     def shoot(self):
-        self.shoot_cooldown = random.randint(30, 90)
-        if has_sound:
-            shoot_sound.play()
+        self.shoot_cooldown = sim_rng.randint(30, 90)
+        voices.play("shoot")
         
         rad_angle = math.radians(self.angle)
         speed_x = -10 * math.cos(rad_angle)
         speed_y = 10 * math.sin(rad_angle)
         
-        bullet = Bullet(self.x, self.y + 15, False, damage=20)
+        bullet = pool.acquire(Bullet, self.x, self.y + 15, False, damage=20)
         bullet.speed_x = speed_x
         bullet.speed_y = speed_y
         return bullet
 
 class Enemy6(Enemy):
-    def __init__(self):
-        super().__init__(-100, random.randint(50, HEIGHT - 50), 6, 10)
-        self.speed = 3
-        self.shoot_cooldown = random.randint(60, 120)
-        self.img = pygame.transform.flip(self.img, True, False)
+    trails = True
+
+    def reset(self):
+        super().reset(-100, sim_rng.randint(50, HEIGHT - 50), 6, 10)
+        self.speed_x = 3
+        self.shoot_cooldown = sim_rng.randint(60, 120)
+        self.img = enemy_flipped_img
+
+    def emit_trail(self, smoking):
+        super().emit_trail(smoking)
+        if sim_rng.random() < 0.2:
+            global_particles.emit(1, self.rect.left + 5, self.rect.centery,
+                                  size=(1, 3), life=(15, 25), colors=[(150, 150, 150)])
+
+    def shoot(self):
+        self.shoot_cooldown = sim_rng.randint(60, 120)
+        voices.play("shoot")
         
-    def update(self):
-        super().update()
-        self.x += self.speed
-        self.rect.x = self.x
+        bullet = pool.acquire(Bullet, self.x + self.rect.width, self.y + self.rect.height//2,
+                              False, damage=10)
+        bullet.speed_x = 8
+        bullet.speed_y = 0
+        return bullet
+
+class Enemy7(Enemy):
+    def reset(self):
+        super().reset(WIDTH, sim_rng.randint(50, int(HEIGHT * 0.35)), 7, 20)
+        self.speed_x = -3
+        self.shoot_cooldown = sim_rng.randint(30, 60)  # Its weapon is the bomb bay
+        # Only bombs while over the playfield
+        self.fire_min_x = 50
+        self.fire_max_x = WIDTH - 50
+
+    def fire(self, player):
+        return self.drop_bomb()
+
+    def draw(self, surface, x, y, health, max_health):
+        surface.blit(self.img, (x, y))
+        super().draw(surface, x, y, health, max_health)
+
+    def drop_bomb(self):
+        self.shoot_cooldown = sim_rng.randint(30, 60)
         
-        if random.random() < 0.2:
-            self.hit_particles.append({
-                'x': self.rect.left + 5,
-                'y': self.rect.centery,
-                'dx': random.uniform(-1.5, -0.5),
-                'dy': random.uniform(-0.3, 0.3),
-                'size': random.randint(1, 3),
-                'life': random.randint(15, 25),
-                'color': (150, 150, 150)
-            })
+        global_particles.emit(5, (self.x, self.x + self.rect.width), self.y + self.rect.height,
+                              dx=(-0.4, 0.4), dy=(0.4, 1.0), size=(1, 3), life=(15, 30),
+                              colors=[(255, 100, 0)])
+        
+        voices.play("shoot")
+        
+        return pool.acquire(Bomb, self.x + self.rect.width//2, self.y + self.rect.height)
+
+# Enemy classes by the type number used in level files and Enemy.type
+ENEMY_TYPES = {1: Enemy1, 2: Enemy2, 3: Enemy3, 4: Enemy4, 5: Enemy5, 6: Enemy6, 7: Enemy7}
+
+LEVELS_FILE = os.path.join("assets", "levels.json")
+LEVEL_FORMAT = 1
+LEVEL_COMPILER = 1  # Bumped whenever compile_levels() output changes, to drop old caches
+
+def _is_count(value, minimum=1):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+
+def _weight_errors(weights, where):
+    if not isinstance(weights, dict) or not weights:
+        return [f"{where}: weights must be a non-empty object of type: weight"]
+    return [f"{where}: bad weight {key!r}: {value!r}" for key, value in weights.items()
+            if not (key.isdigit() and int(key) in ENEMY_TYPES and _is_count(value))]
+
+def validate_levels(data):
+    """Return the problems with a level file's contents, empty if it is valid"""
+    if not isinstance(data, dict) or data.get("format") != LEVEL_FORMAT:
+        return [f'expected an object with "format": {LEVEL_FORMAT}']
+    errors = []
+    if "random_weights" in data:
+        errors += _weight_errors(data["random_weights"], "random_weights")
+    levels = data.get("levels")
+    if not isinstance(levels, list) or not levels:
+        return errors + ['"levels" must be a non-empty list']
+
+    for number, level in enumerate(levels, 1):
+        waves = level.get("waves") if isinstance(level, dict) else None
+        if not isinstance(waves, list) or not waves:
+            errors.append(f'level {number}: "waves" must be a non-empty list')
+            continue
+        for index, wave in enumerate(waves, 1):
+            where = f"level {number} wave {index}"
+            if not isinstance(wave, dict):
+                errors.append(f"{where}: must be an object")
+                continue
+            if not _is_count(wave.get("at"), 0):
+                errors.append(f'{where}: "at" must be a tick count of 0 or more')
+            if ("enemies" in wave) == ("random" in wave):
+                errors.append(f'{where}: needs exactly one of "enemies" or "random"')
+            elif "enemies" in wave:
+                groups = wave["enemies"]
+                if not isinstance(groups, list) or not groups:
+                    errors.append(f'{where}: "enemies" must be a non-empty list')
+                    continue
+                for group in groups:
+                    if not (isinstance(group, list) and len(group) == 2 and
+                            group[0] in ENEMY_TYPES and _is_count(group[1])):
+                        errors.append(f"{where}: enemy group {group!r} must be [type 1-7, count]")
+            else:
+                if not _is_count(wave["random"]):
+                    errors.append(f'{where}: "random" must be an enemy count of 1 or more')
+                if "weights" in wave:
+                    errors += _weight_errors(wave["weights"], where)
+                elif "random_weights" not in data:
+                    errors.append(f'{where}: random wave without "weights" or file "random_weights"')
+    return errors
+
+def compile_levels(data):
+    """Turn validated level data into one spawn schedule per level.
+
+    A schedule is a tuple of (tick, groups, random count, random weights)
+    sorted by tick, where groups are (enemy type, count) pairs and random
+    waves leave their enemies to be picked by weight when the level is built.
+    """
+    default_weights = data.get("random_weights", {})
+    schedules = []
+    for level in data["levels"]:
+        schedule = []
+        for wave in level["waves"]:
+            if "enemies" in wave:
+                groups = tuple((enemy_type, count) for enemy_type, count in wave["enemies"])
+                schedule.append((wave["at"], groups, 0, ()))
+            else:
+                weights = wave.get("weights", default_weights)
+                weights = tuple((int(key), value) for key, value in weights.items())
+                schedule.append((wave["at"], (), wave["random"], weights))
+        schedule.sort(key=lambda entry: entry[0])
+        schedules.append(tuple(schedule))
+    return tuple(schedules)
+
+def parse_compiled_levels(text):
+    """Read compile_levels() output back from its JSON cache form.
+
+    Raises ValueError unless every schedule has the shape compile_levels() gives.
+    """
+    def is_pairs(items, minimum):
+        return isinstance(items, list) and all(
+            isinstance(pair, list) and len(pair) == 2 and pair[0] in ENEMY_TYPES
+            and _is_count(pair[1], minimum) for pair in items)
+
+    data = json.loads(text)
+    if not isinstance(data, list) or not data:
+        raise ValueError("no levels")
+    schedules = []
+    for schedule in data:
+        if not isinstance(schedule, list) or not schedule:
+            raise ValueError("a level without waves")
+        entries = []
+        for entry in schedule:
+            if not (isinstance(entry, list) and len(entry) == 4 and _is_count(entry[0], 0)
+                    and is_pairs(entry[1], 1) and _is_count(entry[2], 0) and is_pairs(entry[3], 1)
+                    and (bool(entry[1]) != bool(entry[2])) and (bool(entry[2]) == bool(entry[3]))):
+                raise ValueError(f"bad wave {entry!r}")
+            tick, groups, random_count, weights = entry
+            entries.append((tick, tuple(map(tuple, groups)), random_count, tuple(map(tuple, weights))))
+        schedules.append(tuple(entries))
+    return tuple(schedules)
+
+class LevelSet:
+    """The compiled spawn schedules of every level in a level file"""
+    compiled = {}  # File hash -> LevelSet, so a file is only compiled once
+
+    def __init__(self, schedules, digest):
+        self.schedules = schedules
+        self.digest = digest
+
+    def __len__(self):
+        return len(self.schedules)
+
+    def schedule(self, number):
+        return self.schedules[number - 1]
+
+    @classmethod
+    def load(cls, path=LEVELS_FILE):
+        """Load a level file, reusing its compiled form when the contents are unchanged.
+
+        Raises ValueError listing every problem if the file is invalid.
+        """
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        if digest in cls.compiled:
+            return cls.compiled[digest]
+
+        cache_path = os.path.join(CACHE_DIR, f"levels-{LEVEL_FORMAT}-{LEVEL_COMPILER}-{digest}.json")
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                schedules = parse_compiled_levels(f.read())
+        except Exception:  # Missing, stale or damaged: compile the file again
+            data = json.loads(raw)
+            errors = validate_levels(data)
+            if errors:
+                raise ValueError(f"{path} is not a valid level file:\n  " + "\n  ".join(errors))
+            schedules = compile_levels(data)
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(schedules, f, separators=(",", ":"))
+                os.replace(cache_path + ".tmp", cache_path)
+            except OSError:
+                pass  # The cache only saves time; play on without it
+
+        level_set = cls.compiled[digest] = cls(schedules, digest)
+        return level_set
+
+level_set = None
+
+def get_level_set():
+    """The game's levels, loaded from LEVELS_FILE on first use"""
+    global level_set
+    if level_set is None:
+        level_set = LevelSet.load()
+    return level_set
+
+class WaveSpec:
+    """One wave of a level: when it spawns and which enemies it brings.
+
+    Holds only enemy classes and counts. The enemies themselves are built
+    by spawn() when the level releases the wave, from the wave's own seed,
+    so unplayed waves cost nothing and spawned enemies are referenced only
+    by the game's enemy list.
+    """
+    __slots__ = ("delay", "groups", "seed")
+
+    def __init__(self, delay, groups, seed):
+        self.delay = delay
+        self.groups = groups  # [(enemy class, count), ...] in spawn order
+        self.seed = seed
+
+    def __len__(self):
+        return sum(count for _, count in self.groups)
+
+    def spawn(self):
+        acquire = pool.acquire
+        # Enemies draw their positions and cooldowns from sim_rng; give them
+        # the wave's stream so a wave spawns the same whenever it is released
+        saved = sim_rng.getstate()
+        sim_rng.seed(self.seed)
+        try:
+            return [acquire(enemy_class) for enemy_class, count in self.groups
+                    for _ in range(count)]
+        finally:
+            sim_rng.setstate(saved)
+
+class Level:
+    def __init__(self, number, unlocked=False):
+        self.number = number
+        self.unlocked = unlocked
+        self.completed = False
+        self.currently_playing = False  # New state
+        self.enemy_waves = []
+        self.current_wave = 0
+        self.wave_timer = 0
+        self.level_timer = 0
+        self.all_enemies_spawned = False
+        self.level_complete = False
+        
+        # Generate enemy waves based on level number
+        self.generate_waves()
+
+    def generate_waves(self):
+        """Build this level's WaveSpecs from its compiled spawn schedule"""
+        self.enemy_waves = []
+        for tick, groups, random_count, weights in get_level_set().schedule(self.number):
+            if random_count:
+                types, type_weights = zip(*weights)
+                groups = [(enemy_type, 1) for enemy_type in
+                          sim_rng.choices(types, weights=type_weights, k=random_count)]
+            groups = [(ENEMY_TYPES[enemy_type], count) for enemy_type, count in groups]
+            self.enemy_waves.append(WaveSpec(tick, groups, sim_rng.getrandbits(32)))
+    
+    def update(self, enemies):
+        self.level_timer += 1
+        
+        # Check if all waves have been spawned
+        if self.current_wave >= len(self.enemy_waves):
+            self.all_enemies_spawned = True
+            return
+        
+        # Check if it's time to spawn the next wave
+        wave = self.enemy_waves[self.current_wave]
+        if self.level_timer >= wave.delay:
+            enemies.extend(wave.spawn())
+            self.current_wave += 1
+    
+    def is_complete(self, enemies):
+        # Level is complete if all enemies are dead and all waves have been spawned
+        if not self.all_enemies_spawned:
+            return False
+            
+        # Check if any enemies are still alive
+        return not enemies
+
+class SpatialHash:
+    """Uniform grid over the playfield used as a collision broadphase.
+
+    Items are stored by integer id (usually their position in an EntityArena)
+    in every cell their rect overlaps, so a query only has to test the
+    handful of items that share a cell with the query rect.
+    """
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def clear(self):
+        self.cells.clear()
+
+    def insert(self, item_id, rect):
+        cs = self.cell_size
+        cells = self.cells
+        for cx in range(rect.left // cs, (rect.right - 1) // cs + 1):
+            for cy in range(rect.top // cs, (rect.bottom - 1) // cs + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    cells[(cx, cy)] = [item_id]
+                else:
+                    bucket.append(item_id)
+
+    def rebuild(self, items):
+        self.clear()
+        for i, item in items.indexed():
+            self.insert(i, item.rect)
+
+    def query(self, rect):
+        """Ids of items sharing a cell with rect, in ascending order"""
+        cs = self.cell_size
+        cells = self.cells
+        found = set()
+        for cx in range(rect.left // cs, (rect.right - 1) // cs + 1):
+            for cy in range(rect.top // cs, (rect.bottom - 1) // cs + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return sorted(found)
+
+class ProximityIndex:
+    """Centres of the live enemies, for nearest-target queries.
+
+    Refilled once per tick and shared by everything that aims at enemies.
+    The coordinate arrays are only built when something queries them, so
+    a tick without a missile to steer only fills a list.
+    Distances are compared squared, and ties go to the enemy earlier in
+    the arena, as a linear scan would pick. Enemies can also be looked up
+    by arena handle, so a missile can keep its target while it is alive.
+    """
+    def __init__(self):
+        self.rebuild(EntityArena())
+
+    def __len__(self):
+        return len(self.entities)
+
+    def rebuild(self, entities):
+        self.entities = []
+        self.seen = 0
+        self.arrays = None
+        self.by_handle = None
+        self.extend(entities)
+
+    def extend(self, entities):
+        """Index what was appended to the arena since it was last seen"""
+        new = [entity for entity in entities.since(self.seen) if not entity.dead]
+        self.seen = entities.end
+        if new:
+            self.entities.extend(new)
+            self.arrays = None
+            self.by_handle = None
+
+    def build(self):
+        """(x, y, handles) of every indexed entity"""
+        if self.arrays is None:
+            entities = self.entities
+            self.arrays = (np.array([entity.rect.centerx for entity in entities], dtype=float),
+                           np.array([entity.rect.centery for entity in entities], dtype=float),
+                           np.array([entity.handle for entity in entities], dtype=np.int64))
+        return self.arrays
+
+    @property
+    def x(self):
+        return self.build()[0]
+
+    @property
+    def y(self):
+        return self.build()[1]
+
+    @property
+    def handles(self):
+        return self.build()[2]
+
+    def distances_sq(self, x, y):
+        return (self.x - x)**2 + (self.y - y)**2
+
+    def nearest(self, x, y):
+        """The closest entity to (x, y), or None if there are none"""
+        if not self.entities:
+            return None
+        return self.entities[int(np.argmin(self.distances_sq(x, y)))]
+
+    def nearest_rows(self, xs, ys):
+        """Row of the closest entity to each point; the index must not be empty"""
+        d2 = (self.x - xs[:, None])**2 + (self.y - ys[:, None])**2
+        return d2.argmin(axis=1)
+
+    def k_nearest(self, x, y, k):
+        """Up to k entities, closest first"""
+        order = np.argsort(self.distances_sq(x, y), kind="stable")[:k]
+        return [self.entities[i] for i in order.tolist()]
+
+    def within(self, x, y, radius):
+        """Entities within radius of (x, y), closest first"""
+        d2 = self.distances_sq(x, y)
+        rows = np.flatnonzero(d2 <= radius * radius)
+        rows = rows[np.argsort(d2[rows], kind="stable")]
+        return [self.entities[i] for i in rows.tolist()]
+
+    def rows_of(self, handles):
+        """Row of each handle, or -1 for entities no longer indexed"""
+        if not self.entities:
+            return np.full(len(handles), -1)
+        if self.by_handle is None:
+            order = np.argsort(self.handles)
+            self.by_handle = (order, self.handles[order])
+        order, sorted_handles = self.by_handle
+        pos = np.minimum(np.searchsorted(sorted_handles, handles), len(order) - 1)
+        return np.where(sorted_handles[pos] == handles, order[pos], -1)
+
+class DirtyRegions:
+    """Tracks which parts of the screen change from frame to frame.
+
+    The screen is split into square tiles. Everything drawn in a frame
+    marks the tiles it touches; the next frame restores only last frame's
+    tiles from the background before drawing, and presentation pushes
+    last frame's and this frame's tiles with pygame.display.update().
+    Tiles are merged into horizontal runs to keep the rect list short.
+    """
+    def __init__(self, tile_size=40):
+        self.tile_size = tile_size
+        self.cols = -(-WIDTH // tile_size)
+        self.rows = -(-HEIGHT // tile_size)
+        self.current = set()
+        self.previous = set()
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Force the next frame to redraw and present the whole screen"""
+        self.full_redraw = True
+        self.current.clear()
+        self.previous.clear()
+
+    def mark(self, rect):
+        ts = self.tile_size
+        left = max(0, rect.left // ts)
+        right = min(self.cols - 1, (rect.right - 1) // ts)
+        top = max(0, rect.top // ts)
+        bottom = min(self.rows - 1, (rect.bottom - 1) // ts)
+        for ty in range(top, bottom + 1):
+            row = ty * self.cols
+            for tx in range(left, right + 1):
+                self.current.add(row + tx)
+
+    def mark_particles(self, particles):
+        n = particles.count
+        if n == 0:
+            return
+        ts = self.tile_size
+        size = particles.size[:n]
+        tiles = []
+        # Particles are smaller than a tile, so their corners cover every tile they touch
+        for xs in (particles.x[:n] - size, particles.x[:n] + size):
+            for ys in (particles.y[:n] - size, particles.y[:n] + size):
+                tx = np.clip(xs // ts, 0, self.cols - 1).astype(np.int32)
+                ty = np.clip(ys // ts, 0, self.rows - 1).astype(np.int32)
+                tiles.append(ty * self.cols + tx)
+        self.current.update(np.unique(np.concatenate(tiles)).tolist())
+
+    def _rects(self, tiles):
+        ts = self.tile_size
+        rects = []
+        for tile in sorted(tiles):
+            ty, tx = divmod(tile, self.cols)
+            last = rects[-1] if rects else None
+            if last and last.y == ty * ts and last.right == tx * ts:
+                last.width += ts
+            else:
+                rects.append(pygame.Rect(tx * ts, ty * ts, ts, ts))
+        return rects
+
+    def begin_frame(self, surface, background):
+        """Erase last frame's drawing (or everything on a full redraw)"""
+        rects = [surface.get_rect()] if self.full_redraw else self._rects(self.previous)
+        for rect in rects:
+            if background:
+                surface.blit(background, rect, rect)
+            else:
+                surface.fill(BLACK, rect)
+
+    def present(self):
+        if self.full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self._rects(self.previous | self.current))
+        self.previous, self.current = self.current, self.previous
+        self.current.clear()
+        self.full_redraw = False
+
+class FrameTimer:
+    """Wall-clock time spent in each phase of the frame pipeline.
+
+    lap(phase) closes the phase that started at the previous lap. Keeps the
+    last frame's numbers and an exponential moving average of each.
+    """
+    PHASES = ("events", "update", "render", "present", "idle")
+
+    def __init__(self, smoothing=0.1):
+        self.smoothing = smoothing
+        self.last = dict.fromkeys(self.PHASES, 0.0)
+        self.average = dict.fromkeys(self.PHASES, 0.0)
+        self.mark = time.perf_counter()
+
+    def start(self):
+        self.mark = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        ms = (now - self.mark) * 1000
+        self.mark = now
+        self.last[phase] = ms
+        self.average[phase] += (ms - self.average[phase]) * self.smoothing
+
+    def busy_ms(self):
+        """Average time per frame spent working rather than waiting on the clock"""
+        return sum(ms for phase, ms in self.average.items() if phase != "idle")
+
+class Tracer:
+    """Timing spans around the main stages of a frame.
+
+    Costs nothing while disabled: enable() swaps each traced method on its
+    class for a timing wrapper and disable() puts the originals back. Spans
+    feed per-frame totals for the on-screen overlay and a list of events
+    that save() writes as a Chrome/Perfetto trace.
+    """
+    # (class name, method, span name)
+    SPANS = (
+        ("Game", "handle_events", "events"),
+        ("Player", "update", "player"),
+        ("Level", "update", "level"),
+        ("Game", "update_player_bullets", "player_bullets"),
+        ("Game", "update_enemies", "enemies"),
+        ("Game", "update_enemy_bullets", "enemy_bullets"),
+        ("Game", "check_collisions", "collisions"),
+        ("Game", "draw_game", "draw"),
+        ("Game", "present", "present"),
+    )
+
+    def __init__(self, max_events=1000000, history=60):
+        self.enabled = False
+        self.path = None  # Chrome trace written here on exit when set
+        self.max_events = max_events
+        self.events = []   # (span, start ns, duration ns)
+        self.current = {}  # Span totals in ns for the frame in progress
+        self.history = deque(maxlen=history)
+        self.frame_start = 0
+        self.originals = []
+
+    def enable(self):
+        if self.enabled:
+            return
+        module = globals()
+        for class_name, method_name, span in self.SPANS:
+            cls = module[class_name]
+            method = cls.__dict__[method_name]
+            self.originals.append((cls, method_name, method))
+            setattr(cls, method_name, self.wrap(method, span))
+        self.frame_start = time.perf_counter_ns()
+        self.enabled = True
+
+    def disable(self):
+        for cls, method_name, method in self.originals:
+            setattr(cls, method_name, method)
+        self.originals.clear()
+        self.current.clear()
+        self.history.clear()
+        self.enabled = False
+
+    def wrap(self, method, span):
+        events = self.events
+        current = self.current
+        max_events = self.max_events
+        clock = time.perf_counter_ns
+
+        def traced(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                duration = clock() - start
+                current[span] = current.get(span, 0) + duration
+                if len(events) < max_events:
+                    events.append((span, start, duration))
+        traced.__wrapped__ = method
+        return traced
+
+    def end_frame(self):
+        now = time.perf_counter_ns()
+        if len(self.events) < self.max_events:
+            self.events.append(("frame", self.frame_start, now - self.frame_start))
+        self.history.append(dict(self.current))
+        self.current.clear()
+        self.frame_start = now
+
+    def average_ms(self):
+        """Mean milliseconds per frame in each span over the recent frames"""
+        totals = {span: 0 for _, _, span in self.SPANS}
+        for frame in self.history:
+            for span, ns in frame.items():
+                totals[span] += ns
+        frames = len(self.history) or 1
+        return {span: ns / frames / 1e6 for span, ns in totals.items()}
+
+    def save(self, path=None):
+        """Write the recorded spans for chrome://tracing or ui.perfetto.dev"""
+        path = path or self.path
+        base = min((start for _, start, _ in self.events), default=0)
+        trace = [{"name": span, "cat": "game", "ph": "X", "pid": 1, "tid": 1,
+                  "ts": (start - base) / 1000, "dur": duration / 1000}
+                 for span, start, duration in self.events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+class SaveWriter:
+    """Writes save files on a background thread.
+
+    Jobs are raw bytes, either replacing a file or appending to it, and run
+    in the order they were asked for. replace() drops any queued job for the
+    same file, since its bytes supersede them, and an append() following a
+    job for the same file joins it, so a burst of saves becomes one write.
+    Replacements go to a temp file that is synced and renamed over the old
+    one, leaving either the old or the new file after a crash, and are
+    skipped when the bytes match what the file already holds. Appends are
+    synced before the job counts as written.
+    """
+    def __init__(self, delay=0.2):
+        self.delay = delay  # Let bursts of requests settle before writing
+        self.wake = threading.Condition()
+        self.pending = []  # [path, append, data] jobs in the order requested
+        self.written = {}  # path -> bytes the file is known to hold
+        self.writing = False
+        self.flushing = False
+        self.thread = None
+        self.writes = 0
+        self.skipped = 0
+        self.coalesced = 0
+
+    def replace(self, path, data):
+        with self.wake:
+            queued = len(self.pending)
+            self.pending = [job for job in self.pending if job[0] != path]
+            self.coalesced += queued - len(self.pending)
+            self.queue([path, False, bytes(data)])
+
+    def append(self, path, data):
+        with self.wake:
+            if self.pending and self.pending[-1][0] == path:
+                self.pending[-1][2] += data
+                self.coalesced += 1
+                self.wake.notify_all()
+            else:
+                self.queue([path, True, bytes(data)])
+
+    def queue(self, job):
+        self.pending.append(job)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.work, name="save-writer", daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+        self.wake.notify_all()
+
+    def work(self):
+        while True:
+            with self.wake:
+                self.wake.wait_for(lambda: self.pending)
+                self.wake.wait_for(lambda: self.flushing, self.delay)
+                path, append, data = self.pending.pop(0)
+                self.writing = True
+            try:
+                self.write(path, append, data)
+            finally:
+                with self.wake:
+                    self.writing = False
+                    self.wake.notify_all()
+
+    def write(self, path, append, data):
+        try:
+            if append:
+                self.written.pop(path, None)
+                with open(path, "ab") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.writes += 1
+                return
+            if path not in self.written:
+                try:
+                    with open(path, "rb") as f:
+                        self.written[path] = f.read()
+                except OSError:
+                    pass
+            if self.written.get(path) == data:
+                self.skipped += 1
+                return
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            self.written[path] = data
+            self.writes += 1
+        except OSError as e:
+            print(f"Failed to save game: {e}")
+
+    def flush(self, timeout=5.0):
+        """Wait until every requested save is on disk; True if they all made it"""
+        with self.wake:
+            self.flushing = True
+            self.wake.notify_all()
+            try:
+                return self.wake.wait_for(lambda: not self.pending and not self.writing, timeout)
+            finally:
+                self.flushing = False
+
+save_writer = SaveWriter()
+
+# Binary saves: a snapshot of the whole save plus a journal of the changes
+# made since, appended a few bytes per event. Loading replays the journal over
+# the snapshot; once it grows long enough, the merged state is written as a
+# new snapshot and the journal starts over. Both files carry a generation
+# number and a journal only applies to the snapshot of the same generation,
+# so a crash between writing the two never applies changes twice.
+SAVE_FORMAT = 1
+SNAPSHOT_MAGIC = b"PSSV"
+JOURNAL_MAGIC = b"PSJN"
+SAVE_HEADER = struct.Struct("<4sBI")  # magic, format, generation
+SAVE_INT_FIELDS = ("high_score", "total_planes_destroyed", "unspent_score", "levels_unlocked",
+                   "upgrades.max_health", "upgrades.shoot_delay",
+                   "upgrades.health_upgrade_cost", "upgrades.firerate_upgrade_cost")
+SAVE_COUNTERS = ("total_planes_destroyed", "unspent_score")  # Journaled as deltas
+SNAPSHOT_INTS = struct.Struct(f"<{len(SAVE_INT_FIELDS)}q")
+JOURNAL_RECORD = struct.Struct("<BBq")  # op, field, value; followed by its crc32
+JOURNAL_CRC = struct.Struct("<I")
+JOURNAL_SET, JOURNAL_ADD, JOURNAL_LEVEL_COMPLETED = 1, 2, 3
+DEFAULT_SAVE = {
+    "player_name": "Player1",
+    "high_score": 0,
+    "total_planes_destroyed": 0,
+    "upgrades": {
+        "max_health": 100,
+        "shoot_delay": 15,
+        "health_upgrade_cost": 100,
+        "firerate_upgrade_cost": 150
+    },
+    "unspent_score": 0,
+    "levels_unlocked": 1,
+    "levels_completed": []
+}
+
+class SaveError(ValueError):
+    pass
+
+def flatten_save(data):
+    """Save data as the flat state the binary format stores"""
+    state = {}
+    for field in SAVE_INT_FIELDS:
+        group, _, key = field.rpartition(".")
+        source = data.get(group, DEFAULT_SAVE[group]) if group else data
+        defaults = DEFAULT_SAVE[group] if group else DEFAULT_SAVE
+        state[field] = int(source.get(key, defaults[key]))
+    state["player_name"] = str(data.get("player_name", DEFAULT_SAVE["player_name"]))
+    state["levels_completed"] = {int(level) for level in data.get("levels_completed", [])}
+    return state
+
+def unflatten_save(state):
+    data = {"player_name": state["player_name"], "upgrades": {}}
+    for field in SAVE_INT_FIELDS:
+        group, _, key = field.rpartition(".")
+        (data[group] if group else data)[key] = state[field]
+    data["levels_completed"] = [str(level) for level in sorted(state["levels_completed"])]
+    return data
+
+def encode_snapshot(state, generation):
+    name = state["player_name"].encode("utf-8")
+    levels = sorted(state["levels_completed"])
+    body = b"".join((
+        SAVE_HEADER.pack(SNAPSHOT_MAGIC, SAVE_FORMAT, generation),
+        SNAPSHOT_INTS.pack(*(state[field] for field in SAVE_INT_FIELDS)),
+        struct.pack("<H", len(name)), name,
+        struct.pack(f"<H{len(levels)}H", len(levels), *levels),
+    ))
+    return body + JOURNAL_CRC.pack(zlib.crc32(body))
+
+def decode_snapshot(blob):
+    """(state, generation) from snapshot bytes; SaveError if they are damaged"""
+    try:
+        body, (crc,) = blob[:-JOURNAL_CRC.size], JOURNAL_CRC.unpack(blob[-JOURNAL_CRC.size:])
+        if zlib.crc32(body) != crc:
+            raise SaveError("snapshot checksum mismatch")
+        magic, version, generation = SAVE_HEADER.unpack_from(body)
+        if magic != SNAPSHOT_MAGIC or version != SAVE_FORMAT:
+            raise SaveError("not a version %d save snapshot" % SAVE_FORMAT)
+        offset = SAVE_HEADER.size
+        state = dict(zip(SAVE_INT_FIELDS, SNAPSHOT_INTS.unpack_from(body, offset)))
+        offset += SNAPSHOT_INTS.size
+        (length,) = struct.unpack_from("<H", body, offset)
+        state["player_name"] = body[offset + 2:offset + 2 + length].decode("utf-8")
+        offset += 2 + length
+        (count,) = struct.unpack_from("<H", body, offset)
+        state["levels_completed"] = set(struct.unpack_from(f"<{count}H", body, offset + 2))
+    except (struct.error, UnicodeDecodeError) as e:
+        raise SaveError(f"truncated snapshot: {e}") from None
+    return state, generation
+
+def encode_journal_record(op, field, value):
+    record = JOURNAL_RECORD.pack(op, field, value)
+    return record + JOURNAL_CRC.pack(zlib.crc32(record))
+
+def replay_journal(blob, state, generation):
+    """Apply the journal's records to state; returns how many applied.
+
+    A journal from another generation is stale and ignored. Replay stops at
+    the first torn or damaged record, which can only be the tail of a write
+    cut short by a crash. Returns None when the journal was stale or had
+    such a tail, as appending to it would then lose the new records.
+    """
+    try:
+        magic, version, journal_generation = SAVE_HEADER.unpack_from(blob)
+    except struct.error:
+        return None
+    if magic != JOURNAL_MAGIC or version != SAVE_FORMAT or journal_generation != generation:
+        return None
+    applied = 0
+    size = JOURNAL_RECORD.size + JOURNAL_CRC.size
+    for offset in range(SAVE_HEADER.size, len(blob) - size + 1, size):
+        record = blob[offset:offset + JOURNAL_RECORD.size]
+        (crc,) = JOURNAL_CRC.unpack_from(blob, offset + JOURNAL_RECORD.size)
+        if zlib.crc32(record) != crc:
+            break
+        op, field, value = JOURNAL_RECORD.unpack(record)
+        if op == JOURNAL_LEVEL_COMPLETED:
+            state["levels_completed"].add(value)
+        elif op in (JOURNAL_SET, JOURNAL_ADD) and field < len(SAVE_INT_FIELDS):
+            key = SAVE_INT_FIELDS[field]
+            state[key] = value if op == JOURNAL_SET else state[key] + value
+        else:
+            break
+        applied += 1
+    if SAVE_HEADER.size + applied * size != len(blob):
+        return None
+    return applied
+
+class SaveStore:
+    """A binary save: snapshot at path, journal of later changes at path + ".journal".
+
+    save() compares the data with what was last persisted and journals only
+    the difference: counters as deltas, other numbers as their new value and
+    each newly completed level. Changes a journal cannot express, such as a
+    new player name or a progress reset, write a fresh snapshot instead, as
+    does every compact_after journaled records. All writes go through
+    save_writer, so the game never waits on the disk.
+    """
+    def __init__(self, path, compact_after=256):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_after = compact_after
+        self.state = None  # What the files hold once save_writer catches up
+        self.generation = 0
+        self.journal_records = 0
+
+    def legacy_path(self):
+        """The JSON save this one replaces, converted on first load"""
+        return os.path.splitext(self.path)[0] + ".json"
+
+    def load(self):
+        """The saved data, or None if there is no save yet"""
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = f.read()
+        except FileNotFoundError:
+            try:
+                with open(self.legacy_path()) as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                return None
+            self.generation = 0
+            self.write_snapshot(data)
+            print(f"Converted {self.legacy_path()} to {self.path}")
+            return unflatten_save(self.state)
+        state, self.generation = decode_snapshot(snapshot)
+        try:
+            with open(self.journal_path, "rb") as f:
+                self.journal_records = replay_journal(f.read(), state, self.generation)
+        except FileNotFoundError:
+            self.journal_records = None
+        self.state = state
+        if self.journal_records != 0:
+            # Fold the replayed changes in now, which also replaces a missing,
+            # stale or torn journal with one that can be appended to
+            self.write_snapshot(unflatten_save(state))
+        return unflatten_save(state)
+
+    def save(self, data):
+        if self.state is None:
+            self.write_snapshot(data)
+            return
+        state = flatten_save(data)
+        if (state["player_name"] != self.state["player_name"]
+                or not state["levels_completed"] >= self.state["levels_completed"]):
+            self.write_snapshot(data)
+            return
+        records = []
+        for index, field in enumerate(SAVE_INT_FIELDS):
+            old, new = self.state[field], state[field]
+            if new == old:
+                continue
+            if field in SAVE_COUNTERS:
+                records.append(encode_journal_record(JOURNAL_ADD, index, new - old))
+            else:
+                records.append(encode_journal_record(JOURNAL_SET, index, new))
+        for level in sorted(state["levels_completed"] - self.state["levels_completed"]):
+            records.append(encode_journal_record(JOURNAL_LEVEL_COMPLETED, 0, level))
+        if not records:
+            return
+        if self.journal_records + len(records) > self.compact_after:
+            self.write_snapshot(data)
+            return
+        save_writer.append(self.journal_path, b"".join(records))
+        self.journal_records += len(records)
+        self.state = state
 
-    def shoot(self):
-        self.shoot_cooldown = random.randint(60, 120)
-        if has_sound:
-            shoot_sound.play()
-        
-        bullet = Bullet(self.x + self.rect.width, self.y + self.rect.height//2, False, damage=10)
-        bullet.speed_x = 8
-        bullet.speed_y = 0
-        bullet.img = pygame.transform.flip(bullet_img, True, False)
-        return bullet
+    def write_snapshot(self, data):
+        """Replace the snapshot with data and start an empty journal after it"""
+        self.state = flatten_save(data)
+        self.generation += 1
+        self.journal_records = 0
+        save_writer.replace(self.path, encode_snapshot(self.state, self.generation))
+        save_writer.replace(self.journal_path,
+                            SAVE_HEADER.pack(JOURNAL_MAGIC, SAVE_FORMAT, self.generation))
 
-class Enemy7(Enemy):
-    def __init__(self):
-        super().__init__(WIDTH, random.randint(50, int(HEIGHT * 0.35)), 7, 20)
-        self.speed = 3
-        self.bomb_cooldown = random.randint(30, 60)
-        self.bomb_trail = []
-        
-    def update(self):
-        super().update()
-        self.x -= self.speed
-        self.rect.x = self.x
-        
-        if self.bomb_cooldown > 0:
-            self.bomb_cooldown -= 1
-            
-        for particle in self.bomb_trail[:]:
-            particle['x'] += particle['dx']
-            particle['y'] += particle['dy']
-            particle['life'] -= 1
-            if particle['life'] <= 0:
-                self.bomb_trail.remove(particle)
+def convert_save(source, target):
+    """Convert between the JSON save layout and the binary one, by extension"""
+    if source.endswith(".json"):
+        with open(source) as f:
+            data = json.load(f)
+        SaveStore(target).write_snapshot(data)
+    else:
+        data = SaveStore(source).load()
+        if data is None:
+            raise SaveError(f"no save at {source}")
+        with open(target, "w") as f:
+            json.dump(data, f, indent=4)
+    save_writer.flush()
 
-    def draw(self, surface):
-        surface.blit(self.img, (self.x, self.y))
-        super().draw(surface)
-        
-        for particle in self.bomb_trail:
-            pygame.draw.circle(surface, (255, 100, 0), 
-                             (int(particle['x']), int(particle['y'])), 
-                             particle['size'])
+def check_save_format():
+    """Exercise the binary save format in a scratch directory.
 
-    def should_drop_bomb(self):
-        return (self.bomb_cooldown <= 0 and 
-                self.x < WIDTH - 50 and 
-                self.x > 50)
+    Returns a description of every check that failed, empty if all passed.
+    """
+    import tempfile
+    failures = []
 
-    def drop_bomb(self):
-        self.bomb_cooldown = random.randint(30, 60)
-        
-        for _ in range(5):
-            self.bomb_trail.append({
-                'x': self.x + random.randint(0, self.rect.width),
-                'y': self.y + self.rect.height,
-                'dx': random.uniform(-0.4, 0.4),
-                'dy': random.uniform(0.4, 1.0),
-                'size': random.randint(1, 3),
-                'life': random.randint(15, 30),
-                'color': (255, random.randint(50, 150), 0)
-            })
-        
-        if has_sound:
-            shoot_sound.play()
-        
-        return Bomb(self.x + self.rect.width//2, self.y + self.rect.height)
+    def check(description, ok):
+        if not ok:
+            failures.append(description)
 
-class Level:
-    def __init__(self, number, unlocked=False):
-        self.number = number
-        self.unlocked = unlocked
-        self.completed = False
-        self.currently_playing = False  # New state
-        self.enemy_waves = []
-        self.current_wave = 0
-        self.wave_timer = 0
-        self.level_timer = 0
-        self.all_enemies_spawned = False
-        self.level_complete = False
-        
-        # Generate enemy waves based on level number
-        self.generate_waves()
-        
-    def generate_waves(self):
-        # Basic level design - can be expanded with more complex patterns
-        if self.number == 1:
-            # Level 1: Simple wave of basic enemies
-            self.enemy_waves = [
-                {"delay": 60, "enemies": [Enemy1() for _ in range(3)]},
-                {"delay": 180, "enemies": [Enemy1() for _ in range(5)]}
-            ]
-        elif self.number == 2:
-            # Level 2: Mix of enemy types
-            self.enemy_waves = [
-                {"delay": 60, "enemies": [Enemy1(), Enemy1(), Enemy2()]},
-                {"delay": 180, "enemies": [Enemy2(), Enemy2(), Enemy1()]}
-            ]
-        elif self.number == 3:
-            # Level 3: More enemies with different patterns
-            self.enemy_waves = [
-                {"delay": 60, "enemies": [Enemy3(), Enemy3()]},
-                {"delay": 180, "enemies": [Enemy2(), Enemy2(), Enemy1(), Enemy1()]}
-            ]
-        elif self.number == 4:
-            # Level 4: First appearance of homing missile enemy
-            self.enemy_waves = [
-                {"delay": 60, "enemies": [Enemy4()]},
-                {"delay": 180, "enemies": [Enemy1(), Enemy1(), Enemy2(), Enemy2()]},
-                {"delay": 300, "enemies": [Enemy4(), Enemy1(), Enemy1()]}
-            ]
-        elif self.number == 5:
-            # Level 5: More challenging mix
-            self.enemy_waves = [
-                {"delay": 60, "enemies": [Enemy5()]},
-                {"delay": 120, "enemies": [Enemy5()]},
-                {"delay": 240, "enemies": [Enemy3(), Enemy3(), Enemy2()]}
-            ]
-        elif self.number == 6:
-            # Level 6: Enemy from left side
-            self.enemy_waves = [
-                {"delay": 60, "enemies": [Enemy6() for _ in range(3)]},
-                {"delay": 180, "enemies": [Enemy6(), Enemy1(), Enemy1()]}
-            ]
-        elif self.number == 7:
-            # Level 7: Bomber enemies
-            self.enemy_waves = [
-                {"delay": 60, "enemies": [Enemy7()]},
-                {"delay": 180, "enemies": [Enemy7(), Enemy1(), Enemy1()]},
-                {"delay": 300, "enemies": [Enemy7(), Enemy7()]}
-            ]
-        else:
-            # Default pattern for higher levels
-            enemy_types = [Enemy1, Enemy2, Enemy3, Enemy4, Enemy5, Enemy6, Enemy7]
-            weights = [30, 25, 15, 10, 10, 5, 5]
-            
-            # Increase difficulty with level number
-            num_waves = min(5, 2 + self.number // 5)
-            enemies_per_wave = min(10, 3 + self.number // 3)
-            
-            for i in range(num_waves):
-                wave_enemies = []
-                for _ in range(enemies_per_wave):
-                    enemy_class = random.choices(enemy_types, weights=weights, k=1)[0]
-                    wave_enemies.append(enemy_class())
-                
-                self.enemy_waves.append({
-                    "delay": 60 + i * 120,
-                    "enemies": wave_enemies
-                })
-    
-    def update(self, enemies):
-        self.level_timer += 1
-        
-        # Check if all waves have been spawned
-        if self.current_wave >= len(self.enemy_waves):
-            self.all_enemies_spawned = True
-            return
-        
-        # Check if it's time to spawn the next wave
-        if self.level_timer >= self.enemy_waves[self.current_wave]["delay"]:
-            enemies.extend(self.enemy_waves[self.current_wave]["enemies"])
-            self.current_wave += 1
-    
-    def is_complete(self, enemies):
-        # Level is complete if all enemies are dead and all waves have been spawned
-        if not self.all_enemies_spawned:
-            return False
-            
-        # Check if any enemies are still alive
-        for enemy in enemies:
-            if not enemy.dead:
-                return False
-                
-        return True
+    played = copy.deepcopy(DEFAULT_SAVE)
+    played.update(high_score=420, total_planes_destroyed=12, unspent_score=80,
+                  levels_unlocked=3, levels_completed=["1", "2"])
+    played["upgrades"]["max_health"] = 120
+    expected = unflatten_save(flatten_save(played))
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "save.psav")
+        store = SaveStore(path)
+        store.write_snapshot(dict(DEFAULT_SAVE, total_planes_destroyed=5, unspent_score=30))
+        store.save(played)
+        save_writer.flush()
+        check("changes after a snapshot are journaled, not rewritten",
+              os.path.getsize(store.journal_path) > SAVE_HEADER.size)
+        check("snapshot plus journal load back the saved data", SaveStore(path).load() == expected)
+
+        save_writer.flush()  # The load above folded the journal into a new snapshot
+        store = SaveStore(path)
+        store.load()
+        store.save(dict(played, high_score=500))
+        save_writer.flush()
+        record = encode_journal_record(JOURNAL_SET, 0, 999)
+        with open(store.journal_path, "ab") as f:
+            f.write(record[:-1] + bytes([record[-1] ^ 0xFF]))  # Full length, bad checksum
+        check("a damaged last record is dropped", SaveStore(path).load()["high_score"] == 500)
+        save_writer.flush()
+        with open(store.journal_path, "ab") as f:
+            f.write(encode_journal_record(JOURNAL_SET, 0, 999)[:5])
+        check("a torn last record is dropped", SaveStore(path).load()["high_score"] == 500)
+        save_writer.flush()
+        check("loading replaces a torn journal with an empty one",
+              os.path.getsize(store.journal_path) == SAVE_HEADER.size)
+
+        store = SaveStore(path)
+        store.load()
+        with open(store.journal_path, "wb") as f:
+            f.write(SAVE_HEADER.pack(JOURNAL_MAGIC, SAVE_FORMAT, store.generation - 1))
+            f.write(encode_journal_record(JOURNAL_SET, 0, 999))
+        check("a journal from an older generation is ignored",
+              SaveStore(path).load()["high_score"] == 500)
+        save_writer.flush()
+
+        source, binary, back = (os.path.join(scratch, name)
+                                for name in ("source.json", "converted.psav", "back.json"))
+        with open(source, "w") as f:
+            json.dump(played, f)
+        convert_save(source, binary)
+        convert_save(binary, back)
+        with open(back) as f:
+            check("JSON converts to binary and back unchanged", json.load(f) == expected)
+    return failures
 
 class Game:
-    def __init__(self):
-        self.state = GameState.MAIN_MENU
+    def __init__(self, save_file="savegame.psav"):
+        self.state = GameState.MAIN_MENU if assets.images_ready else GameState.LOADING
         self.player = Player()
-        self.enemies = []
-        self.enemy_bullets = []
+        self.enemies = EntityArena()
+        self.enemy_bullets = EntityArena()
         self.player_bullets = []
         self.enemy_spawn_timer = 0
         self.current_score = 0
         self.planes_destroyed = 0
+        self.enemy_grid = SpatialHash()
+        self.enemy_bullet_grid = SpatialHash()
+        self.targets = ProximityIndex()  # Live enemies this tick, for anything that aims
+        self.dirty_rendering = DIRTY_RECTS
+        self.dirty_regions = DirtyRegions()
+        self.frame_timer = FrameTimer()
+        self.target_fps = 60  # Display rate cap, 0 for uncapped
+        self.time_scale = 1.0  # Simulation speed, >1 fast-forwards
+        self.max_ticks_per_frame = 5
+        self.tick_accumulator = 0.0
+        self.interpolation_alpha = 1.0
+        self.show_frame_stats = False
+        self.show_trace_overlay = False
         self.clock = pygame.time.Clock()
-        self.font = pygame.font.SysFont(None, 36)
-        self.title_font = pygame.font.SysFont(None, 72)
-        self.instruction_font = pygame.font.SysFont(None, 24)
-        self.pakts_font = pygame.font.SysFont(None, 50)
         self.player_name = "Player1"
         self.mouse_pos = (0, 0)
         self.mouse_clicked = False
         self.active_button = None
         self.already_saved = False
-        self.save_file = "savegame.json"
-        self.save_data = {
-            "player_name": "Player1",
-            "high_score": 0,
-            "total_planes_destroyed": 0,
-            "upgrades": {
-                "max_health": 100,
-                "shoot_delay": 15,
-                "health_upgrade_cost": 100,
-                "firerate_upgrade_cost": 150
-            },
-            "unspent_score": 0,
-            "levels_unlocked": 1,
-            "levels_completed": []
-        }
+        self.save_file = save_file  # None keeps progress in memory only
+        self.save_store = SaveStore(save_file) if save_file else None
+        self.frame = 0
+        self.seed = None  # Fixed session seed, a fresh one per game if None
+        self.session_seed = None
+        self.record_path = None  # Write each session's inputs here when set
+        self.recording = None
+        self.recorded_sessions = 0
+        self.pending_flags = 0  # E/M presses waiting for the next tick
+        self.save_data = copy.deepcopy(DEFAULT_SAVE)
         
         # Level system
-        self.levels = [Level(i+1, i==0) for i in range(25)]  # 25 levels
+        self.levels = [Level(i+1, i==0) for i in range(len(get_level_set()))]
+        self.level_page = 0
         self.current_level = None
         self.level_score = 0
         self.level_planes_destroyed = 0
         self.load_game()  
+
+    # Fonts are created the first time something is drawn with them
+    @property
+    def font(self):
+        return get_font(36)
+
+    @property
+    def title_font(self):
+        return get_font(72)
+
+    @property
+    def instruction_font(self):
+        return get_font(24)
+
+    @property
+    def pakts_font(self):
+        return get_font(50)
         
     def load_game(self, force_defaults=False):
+        if self.save_file is None:
+            force_defaults = True
         try:
             if not force_defaults:
-                with open(self.save_file, "r") as f:
-                    self.save_data = json.load(f)
+                self.save_data = self.save_store.load()
+                if self.save_data is None:
+                    raise FileNotFoundError(f"no save at {self.save_file}")
             
             # Initialize all values from save data
             self.player_name = self.save_data.get("player_name", "Player1")
@@ -1212,24 +3145,11 @@ class Game:
                 if str(i+1) in levels_completed:
                     level.completed = True
                 
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+        except (FileNotFoundError, json.JSONDecodeError, SaveError) as e:
             if not force_defaults:
                 print(f"Error loading save: {e}, creating new save")
             # Initialize new save data
-            self.save_data = {
-                "player_name": "Player1",
-                "high_score": 0,
-                "total_planes_destroyed": 0,
-                "upgrades": {
-                    "max_health": 100,
-                    "shoot_delay": 15,
-                    "health_upgrade_cost": 100,
-                    "firerate_upgrade_cost": 150
-                },
-                "unspent_score": 0,
-                "levels_unlocked": 1,
-                "levels_completed": []
-            }
+            self.save_data = copy.deepcopy(DEFAULT_SAVE)
             self.save_game()
 
     def save_game(self):
@@ -1258,14 +3178,14 @@ class Game:
                 completed_levels.append(str(level.number))
         self.save_data["levels_completed"] = completed_levels
         
-        try:
-            with open(self.save_file, "w") as f:
-                json.dump(self.save_data, f, indent=4)
-        except Exception as e:
-            print(f"Failed to save game: {e}")
+        if self.save_file is None:
+            return
+        self.save_store.save(self.save_data)
 
     def reset_game(self):
         """Completely reset the game state for a fresh start"""
+        self.begin_session()
+        self.player.bullets.clear()
         # Create a new player instance to ensure clean state
         self.player = Player()
         
@@ -1276,11 +3196,11 @@ class Game:
         self.player.upgrade_cost_health = self.save_data["upgrades"]["health_upgrade_cost"]
         self.player.upgrade_cost_firerate = self.save_data["upgrades"]["firerate_upgrade_cost"]
         
-        # Clear all game objects
-        self.enemies = []
-        self.enemy_bullets = []
-        self.player.bullets = []
+        # Clear all game objects, handing them back to the pool
+        self.enemies.clear()
+        self.enemy_bullets.clear()
         global_particles.clear()
+        world.clear()
         
         # Reset timers and counters
         self.enemy_spawn_timer = 0
@@ -1343,6 +3263,21 @@ class Game:
             text = self.font.render(stat, True, WHITE)
             screen.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT - 270 + i * 40))
 
+        # Sounds keep loading in the background once the menu is up
+        if not assets.done:
+            self.draw_loading_bar(WIDTH - 220, HEIGHT - 30, 200)
+
+    def draw_loading_screen(self):
+        title = self.title_font.render("PLANE SHOOTER", True, WHITE)
+        screen.blit(title, title.get_rect(center=(WIDTH//2, HEIGHT//3)))
+        self.draw_loading_bar(WIDTH//2 - 200, HEIGHT//2, 400)
+
+    def draw_loading_bar(self, x, y, width):
+        text = hud_text.text_cache.get(self.instruction_font, f"Loading {assets.current or 'assets'}...", WHITE)
+        screen.blit(text, (x, y - text.get_height() - 4))
+        pygame.draw.rect(screen, GRAY, (x, y, width, 12))
+        pygame.draw.rect(screen, GREEN, (x, y, int(width * assets.progress), 12))
+
     def draw_level_select(self):
         if bg_img:
             screen.blit(bg_img, (0, 0))
@@ -1362,12 +3297,15 @@ class Game:
         if self.draw_button("Back", 20, 20, 100, 40, GRAY, LIGHT_GRAY):
             self.state = GameState.MAIN_MENU
         
-        # Draw level buttons (5x5 grid)
-        level_buttons = []
+        # Draw level buttons (5x5 grid per page)
+        page_size = 25
+        pages = (len(self.levels) + page_size - 1) // page_size
+        self.level_page = min(self.level_page, pages - 1)
+        first = self.level_page * page_size
         for i in range(5):  # Rows
             for j in range(5):  # Columns
-                level_num = i * 5 + j + 1
-                if level_num > 25:  # Only show 25 levels
+                level_num = first + i * 5 + j + 1
+                if level_num > len(self.levels):
                     continue
                     
                 level = self.levels[level_num-1]
@@ -1392,8 +3330,16 @@ class Game:
                 if self.draw_button(str(level_num), x, y, 80, 80, color, hover_color):
                     if level.unlocked:
                         self.start_level(level_num)
-        
-        pygame.display.flip()
+
+        # Page through the levels when there are more than fit on screen
+        if pages > 1:
+            page_text = self.instruction_font.render(f"Page {self.level_page + 1}/{pages}", True, WHITE)
+            screen.blit(page_text, (WIDTH//2 - page_text.get_width()//2, HEIGHT - 40))
+            if self.level_page > 0 and self.draw_button("<", 20, HEIGHT//2 - 20, 100, 40, GRAY, LIGHT_GRAY):
+                self.level_page -= 1
+            if (self.level_page < pages - 1 and
+                    self.draw_button(">", WIDTH - 120, HEIGHT//2 - 20, 100, 40, GRAY, LIGHT_GRAY)):
+                self.level_page += 1
 
     def start_level(self, level_num):
         # Reset all current flags first
@@ -1453,7 +3399,7 @@ class Game:
         
         # Next level button (only if there is a next level and it's unlocked)
         next_level_num = self.current_level.number + 1
-        next_level_unlocked = next_level_num <= 25 and (next_level_num <= self.save_data["levels_unlocked"])
+        next_level_unlocked = next_level_num <= len(self.levels) and (next_level_num <= self.save_data["levels_unlocked"])
         
         if next_level_unlocked:
             button_states['next'] = self.draw_button(
@@ -1505,8 +3451,6 @@ class Game:
             self.state = GameState.MAIN_MENU
         elif button_states['shop']:
             self.state = GameState.SHOP
-        
-        pygame.display.flip()
 
     def draw_shop(self):
         if bg_img:
@@ -1572,7 +3516,7 @@ class Game:
         color = active_color if mouse_over else inactive_color
         pygame.draw.rect(screen, color, (x, y, width, height))
         
-        text_surf = self.font.render(text, True, BLACK)
+        text_surf = hud_text.text_cache.get(self.font, text, BLACK)
         text_rect = text_surf.get_rect(center=(x + width/2, y + height/2))
         screen.blit(text_surf, text_rect)
         
@@ -1598,12 +3542,14 @@ class Game:
                 if button.get("reset", False):
                     self.reset_game()
                 self.state = button["action"]
-        
-        pygame.display.flip()
 
     def draw_game(self):
+        dirty = self.dirty_rendering and self.state == GameState.PLAYING
+
         # Draw background
-        if bg_img:
+        if dirty:
+            self.dirty_regions.begin_frame(screen, bg_img)
+        elif bg_img:
             screen.blit(bg_img, (0, 0))
         else:
             screen.fill(BLACK)
@@ -1611,42 +3557,35 @@ class Game:
         # Only draw game elements if not in game over state
         if self.state != GameState.GAME_OVER and self.state != GameState.LEVEL_COMPLETE:
             # Draw bullets
-            for bullet in self.player.bullets:
-                bullet.draw()
-            for bullet in self.enemy_bullets:
-                bullet.draw()
+            draw_system("player_shots", screen)
+            draw_system("enemy_shots", screen)
 
             # Draw enemies
-            for enemy in self.enemies:
-                enemy.draw(screen)
-                enemy.draw_particles(screen)
+            draw_system("enemies", screen)
 
             # Draw player (including death animation)
             self.player.draw(screen)
-            self.player.draw_hit_particles(screen)
 
             # Draw particles
-            for p in global_particles[:]:
-                pygame.draw.circle(screen, p['color'], (int(p['x']), int(p['y'])), p['size'])
-                p['x'] += p['dx']
-                p['y'] += p['dy']
-                p['life'] -= 1
-                if p['life'] <= 0:
-                    global_particles.remove(p)
+            global_particles.draw(screen)
 
             # Draw UI (only if not dead)
+            hud_right = []
             if not self.player.dead:
-                health_text = self.font.render(f"Health: {self.player.health}/{self.player.max_health}", True, WHITE)
-                score_text = self.font.render(f"Score: {self.current_score} (Best: {self.save_data['high_score']})", True, WHITE)
-                planes_text = self.font.render(f"Planes: {self.planes_destroyed}", True, WHITE)
-                missile_text = self.font.render(f"Missiles: {self.player.missiles}/{self.player.max_missiles}", True, (0, 255, 255))
-                level_text = self.font.render(f"Level: {self.current_level.number if self.current_level else 'Endless'}", True, WHITE)
-                
-                screen.blit(health_text, (10, 10))
-                screen.blit(score_text, (10, 50))
-                screen.blit(planes_text, (10, 90))
-                screen.blit(missile_text, (10, 130))
-                screen.blit(level_text, (10, 170))
+                hud_right.append(hud_text.draw(screen, self.font, WHITE, (10, 10),
+                              "Health: ", self.player.health, "/", self.player.max_health))
+                hud_right.append(hud_text.draw(screen, self.font, WHITE, (10, 50),
+                              "Score: ", self.current_score, " (Best: ", self.save_data['high_score'], ")"))
+                hud_right.append(hud_text.draw(screen, self.font, WHITE, (10, 90),
+                              "Planes: ", self.planes_destroyed))
+                hud_right.append(hud_text.draw(screen, self.font, (0, 255, 255), (10, 130),
+                              "Missiles: ", self.player.missiles, "/", self.player.max_missiles))
+                hud_right.append(hud_text.draw(screen, self.font, WHITE, (10, 170),
+                              "Level: ", self.current_level.number if self.current_level else "Endless"))
+
+            if dirty:
+                self.mark_dirty_regions(hud_right)
+                return
         elif self.state == GameState.LEVEL_COMPLETE:
             # Draw level complete screen
             self.draw_level_complete()
@@ -1654,54 +3593,98 @@ class Game:
         else:
             # Draw game over screen when appropriate
             self.draw_game_over()
-            return  # Skip the rest of the drawing
-
-        pygame.display.flip()
         
+    def mark_dirty_regions(self, hud_right):
+        """Mark everything draw_game just drew, padded for rotation and health bars"""
+        mark = self.dirty_regions.mark
+        for group, (dx, dy, w, h) in (("player_shots", (-4, -4, 24, 24)),
+                                      ("enemy_shots", (-4, -4, 24, 24)),
+                                      ("enemies", (-6, -12, 64, 56))):
+            for store, c in world.query(group, "position"):
+                for x, y in zip(c.x.astype(int).tolist(), c.y.astype(int).tolist()):
+                    mark(pygame.Rect(x + dx, y + dy, w, h))
+
+        player = self.player
+        if not player.death_animation:
+            mark(pygame.Rect(int(player.x) - 6, int(player.y) - 12, 64, 52))
+        if player.mouse_control:
+            mouse_x, mouse_y = pygame.mouse.get_pos()
+            mark(pygame.Rect(mouse_x - 11, mouse_y - 11, 22, 22))
+
+        self.dirty_regions.mark_particles(global_particles)
+
+        line_height = self.font.get_height()
+        for i, right in enumerate(hud_right):
+            mark(pygame.Rect(10, 10 + i * 40, right - 10, line_height))
+
     def check_collisions(self):
-        # Player bullets hit enemies
-        for bullet in self.player.bullets[:]:
-            for enemy in self.enemies[:]:
-                if bullet.rect.colliderect(enemy.rect) and not enemy.dead:
-                    enemy.health -= bullet.damage
-                    
-                    if enemy.health <= 0:
-                        enemy.create_death_particles()
-                        global_particles.extend(enemy.death_particles)
-                        self.player.bullets.remove(bullet)
-                        self.enemies.remove(enemy)
-                        score_gain = 1 * enemy.max_health
-                        self.current_score += score_gain
-                        self.level_score += score_gain
-                        self.planes_destroyed += 1
-                        self.level_planes_destroyed += 1
-                        if has_sound:
-                            explosion_sound.play()
+        player = self.player
+
+        # Enemy bullets hit player
+        if self.enemy_bullets:
+            self.enemy_bullet_grid.rebuild(self.enemy_bullets)
+            hits = [i for i in self.enemy_bullet_grid.query(player.rect)
+                    if self.enemy_bullets[i].rect.colliderect(player.rect)]
+            for i in hits:
+                bullet = self.enemy_bullets[i]
+                if not player.invulnerable:
+                    player.health -= bullet.damage
+                    if player.health <= 0:
+                        player.health = 0
+                        player.init_death_effect()
                     else:
-                        self.player.bullets.remove(bullet)
-                        for _ in range(3):
-                            enemy.death_particles.append({
-                                'x': bullet.rect.centerx,
-                                'y': bullet.rect.centery,
-                                'dx': random.uniform(-1, 1),
-                                'dy': random.uniform(-1, 1),
-                                'size': random.randint(1, 2),
-                                'life': random.randint(5, 10),
-                                'color': (255, random.randint(100, 200), 0)
-                            })
-                        if has_sound:
-                            shoot_sound.play()
-                    break
+                        player.flash()
+                    voices.play("explosion")
+                self.enemy_bullets.remove(bullet)
+
+        # Player bullets hit enemies
+        enemies = self.enemies
+        grid = self.enemy_grid
+        grid.clear()
+        for i, enemy in enemies.indexed():
+            if not enemy.dead:
+                grid.insert(i, enemy.rect)
+
+        if enemies and player.bullets:
+            for bullet in player.bullets:
+                enemy = None
+                for i in grid.query(bullet.rect):
+                    if enemies[i] is not None and bullet.rect.colliderect(enemies[i].rect):
+                        enemy = enemies[i]
+                        break
+                if enemy is None:
+                    continue
+                player.bullets.remove(bullet)
+
+                enemy.health -= bullet.damage
+                if enemy.health <= 0:
+                    enemy.create_death_particles()
+                    enemies.remove(enemy)
+                    score_gain = 1 * enemy.max_health
+                    self.current_score += score_gain
+                    self.level_score += score_gain
+                    self.planes_destroyed += 1
+                    self.level_planes_destroyed += 1
+                    voices.play("explosion")
+                else:
+                    enemy.create_hit_particles(bullet.rect.centerx, bullet.rect.centery)
+                    voices.play("shoot")
 
         # Enemy collision with player
-        for enemy in self.enemies[:]:
-            if not self.player.invulnerable and not enemy.dead and self.player.rect.colliderect(enemy.rect):
-                if self.player.health > 0:
-                    self.player.health = 0
-                    self.player.init_death_effect()
-                    if has_sound:
-                        explosion_sound.play()
-                break
+        if not player.invulnerable:
+            for i in grid.query(player.rect):
+                if enemies[i] is not None and player.rect.colliderect(enemies[i].rect):
+                    if player.health > 0:
+                        player.health = 0
+                        player.init_death_effect()
+                        voices.play("explosion")
+                    break
+
+    def compact_entities(self):
+        """Drop everything removed this tick from the entity arenas, once per tick"""
+        self.player.bullets.compact()
+        self.enemies.compact()
+        self.enemy_bullets.compact()
 
     def handle_events(self):
         self.mouse_clicked = False  # Reset click state each frame
@@ -1717,13 +3700,22 @@ class Game:
                 if event.key == pygame.K_p and self.state == GameState.PLAYING:
                     self.state = GameState.PAUSED
                     
+                # E and M go through the input frame of the next tick so they are recorded
                 if event.key == pygame.K_m:
-                    self.player.mouse_control = not self.player.mouse_control
+                    self.pending_flags ^= InputFrame.TOGGLE_MOUSE
+
+                if event.key == pygame.K_F3:
+                    self.show_frame_stats = not self.show_frame_stats
+
+                if event.key == pygame.K_F5:
+                    self.toggle_trace_overlay()
+
+                if event.key == pygame.K_F4:
+                    # Cycle fast-forward: 1x -> 2x -> 4x -> 1x
+                    self.time_scale = self.time_scale * 2 if self.time_scale < 4 else 1.0
                     
                 if event.key == pygame.K_e and self.state == GameState.PLAYING:
-                    missile = self.player.fire_missile(self.enemies)
-                    if missile:
-                        self.player.bullets.append(missile)
+                    self.pending_flags |= InputFrame.FIRE_MISSILE
                         
             if event.type == pygame.MOUSEMOTION:
                 self.mouse_pos = event.pos
@@ -1740,20 +3732,25 @@ class Game:
             self.state = GameState.PLAYING
         elif self.state == GameState.GAME_OVER:
             self.state = GameState.MAIN_MENU
-        elif self.state == GameState.MAIN_MENU:
+        elif self.state in (GameState.MAIN_MENU, GameState.LOADING):
             self.state = GameState.QUIT
         elif self.state == GameState.LEVEL_SELECT:
             self.state = GameState.MAIN_MENU
         elif self.state == GameState.LEVEL_COMPLETE:
             self.state = GameState.MAIN_MENU
 
-    def update_game(self):
+    def update_game(self, keys=None, mouse_pos=None):
         if self.state != GameState.PLAYING:
             return
+        sim_clock.advance()
             
-        keys = pygame.key.get_pressed()
-        mouse_pos = pygame.mouse.get_pos()
+        if keys is None:
+            keys = pygame.key.get_pressed()
+        if mouse_pos is None:
+            mouse_pos = pygame.mouse.get_pos()
         
+        global_particles.update()
+
         # Update player
         death_complete = self.player.update(keys, mouse_pos)
         
@@ -1785,7 +3782,7 @@ class Game:
                 
                 # Unlock next level if it exists
                 next_level_num = self.current_level.number + 1
-                if next_level_num <= 25:
+                if next_level_num <= len(self.levels):
                     self.levels[next_level_num-1].unlocked = True
                     self.save_data["levels_unlocked"] = max(
                         self.save_data.get("levels_unlocked", 1),
@@ -1806,108 +3803,229 @@ class Game:
             # Endless mode enemy spawning
             self.enemy_spawn_timer += 1
             if self.enemy_spawn_timer > 120:
-                enemy_type = random.choices([1, 2, 3, 4, 5, 6, 7], weights=[20, 30, 20, 10, 10, 7, 7], k=1)[0]
-                if enemy_type == 1:
-                    self.enemies.append(Enemy1())
-                elif enemy_type == 2:
-                    self.enemies.append(Enemy2())
-                elif enemy_type == 3:
-                    self.enemies.append(Enemy3())
-                elif enemy_type == 4:
-                    self.enemies.append(Enemy4())
-                elif enemy_type == 5:
-                    self.enemies.append(Enemy5())
-                elif enemy_type == 6:
-                    self.enemies.append(Enemy6())
-                else:
-                    self.enemies.append(Enemy7())
+                enemy_type = sim_rng.choices([1, 2, 3, 4, 5, 6, 7], weights=[20, 30, 20, 10, 10, 7, 7], k=1)[0]
+                self.enemies.append(pool.acquire(ENEMY_TYPES[enemy_type]))
                 self.enemy_spawn_timer = 0
 
-        # Update player bullets
-        for bullet in self.player.bullets[:]:
-            if isinstance(bullet, PlayerHomingMissile):
-                if not bullet.update(self.enemies):
-                    self.player.bullets.remove(bullet)
-            else:
-                bullet.update()
-                if bullet.x > WIDTH:
-                    self.player.bullets.remove(bullet)
-
-        # Update enemies
-        for enemy in self.enemies[:]:
-            enemy.update()
-            if (enemy.x < -100) or (enemy.x > WIDTH + 100):
+        self.update_player_bullets()
+        self.update_enemies()
+        self.update_enemy_bullets()
+        self.check_collisions()
+
+    def update_player_bullets(self):
+        """Move player bullets and missiles and drop the ones that left the screen"""
+        self.targets.extend(self.enemies)  # Enemies spawned earlier in this tick
+        gone = []
+        for store, c in world.query("player_shots"):
+            if "seeker" in store.cls.component_set:
+                seeker_system(store, c, self.targets)
+            move_system(store, c)
+            place_system(store, c, gone)
+        self.player.bullets.remove_all(gone)
+
+    def update_enemies(self):
+        """Move every enemy, drop the ones that left the screen and let the rest fire.
+
+        The systems update each enemy store's columns in one pass over the
+        stores. Only the enemies they flag get a Python step, taken in spawn
+        order so the simulation RNG is drawn in the same order on every run.
+        """
+        steps = []
+        for store, c in world.query("enemies"):
+            has = store.cls.component_set
+            if "steering" in has:
+                steering_system(store, c)
+            move_system(store, c)
+            if "stop_at" in has:
+                stop_system(store, c)
+            if "bounce" in has:
+                bounce_system(store, c)
+            if "steering" in has:
+                lane_system(store, c)
+            cooldown_system(store, c)
+            enemy_steps(store, c, self.player, steps)
+        steps.sort(key=itemgetter(0))
+        for _, enemy, smoking, off_screen, ready in steps:
+            enemy.emit_trail(smoking)
+            if off_screen:
                 self.enemies.remove(enemy)
-                continue
-            if not enemy.dead:
-                if enemy.type == 4:
-                    if enemy.should_shoot(self.player):
-                        self.enemy_bullets.append(enemy.shoot(self.player.x, self.player.y))
-                elif enemy.type == 6:
-                    if enemy.should_shoot():
-                        bullet = enemy.shoot()
-                        if bullet:
-                            self.enemy_bullets.append(bullet)
-                elif enemy.type == 7:
-                    if enemy.should_drop_bomb():
-                        bomb = enemy.drop_bomb()
-                        self.enemy_bullets.append(bomb)
-                else:
-                    if enemy.should_shoot():
-                        self.enemy_bullets.append(enemy.shoot())
-
-        # Update enemy bullets
-        i = 0
-        while i < len(self.enemy_bullets):
-            bullet = self.enemy_bullets[i]
-            remove_bullet = False
-            if isinstance(bullet, EnemyHomingMissile):
-                if not bullet.update(self.player.x, self.player.y):
-                    remove_bullet = True
-                elif (bullet.x < -50 or bullet.x > WIDTH + 50 or
-                        bullet.y < -50 or bullet.y > HEIGHT + 50):
-                    remove_bullet = True
-            elif isinstance(bullet, Bomb):
-                if not bullet.update():
-                    remove_bullet = True
-            else:
-                bullet.update()
-                if bullet.x < 0:
-                    remove_bullet = True
-            if not remove_bullet and bullet.rect.colliderect(self.player.rect):
-                remove_bullet = True
-                if not self.player.invulnerable:
-                    self.player.health -= bullet.damage
-                    if self.player.health <= 0:
-                        self.player.health = 0
-                        self.player.init_death_effect()
-                    else:
-                        self.player.flash()
-                    if has_sound:
-                        explosion_sound.play()
-            if remove_bullet:
-                self.enemy_bullets.pop(i)
-            else:
-                i += 1
+            elif ready and not enemy.dead:
+                self.enemy_bullets.append(enemy.fire(self.player))
 
-        self.check_collisions()
+    def update_enemy_bullets(self):
+        """Move enemy bullets, missiles and bombs and drop the expired ones"""
+        now = sim_clock.get_ticks()
+        expired, gone = [], []
+        for store, c in world.query("enemy_shots"):
+            has = store.cls.component_set
+            if "lifetime" in has:
+                lifetime_system(store, c, now, expired)
+            if "homing" in has:
+                homing_system(store, c, self.player.x, self.player.y, now)
+            move_system(store, c)
+            if "drift" in has:
+                drift_system(store, c)
+            if "spin" in has:
+                spin_system(store, c)
+            place_system(store, c, gone)
+        self.enemy_bullets.remove_all(expired)
+        self.enemy_bullets.remove_all(gone)
 
-    def reset_for_new_player(self):
-        """Completely reset all progress for a new player"""
-        self.save_data = {
-            "player_name": "Player1",
-            "high_score": 0,
-            "total_planes_destroyed": 0,
-            "upgrades": {
-                "max_health": 100,
-                "shoot_delay": 15,
-                "health_upgrade_cost": 100,
-                "firerate_upgrade_cost": 150
+    def begin_session(self):
+        """Seed a fresh game session and start recording it if asked to"""
+        self.finish_recording()
+        self.session_seed = self.seed if self.seed is not None else random.randrange(2**32)
+        seed_simulation(self.session_seed)
+        self.pending_flags = 0
+        if self.record_path:
+            level = self.current_level.number if self.current_level else None
+            upgrades = self.save_data["upgrades"]
+            self.recording = InputRecording(self.session_seed, level, sim_clock.tick_rate,
+                                            upgrades["max_health"], upgrades["shoot_delay"])
+
+    def finish_recording(self):
+        """Write out the session recorded so far, if any, to its own file"""
+        if self.recording is not None and len(self.recording):
+            self.recorded_sessions += 1
+            self.recording.save(self.session_record_path(self.recorded_sessions))
+        self.recording = None
+
+    def session_record_path(self, number):
+        """record_path for the first session, then run-2.psrp, run-3.psrp and so on"""
+        if number == 1:
+            return self.record_path
+        root, ext = os.path.splitext(self.record_path)
+        return f"{root}-{number}{ext}"
+
+    def tick(self, frame):
+        """Advance the simulation by one tick driven only by the given InputFrame"""
+        if frame.flags & InputFrame.TOGGLE_MOUSE:
+            self.player.mouse_control = not self.player.mouse_control
+        self.player.mouse_button_down = bool(frame.flags & InputFrame.MOUSE_DOWN)
+
+        self.targets.rebuild(self.enemies)
+        if frame.flags & InputFrame.FIRE_MISSILE and self.state == GameState.PLAYING:
+            missile = self.player.fire_missile(self.targets)
+            if missile:
+                self.player.bullets.append(missile)
+
+        self.update_game(frame.keys(), frame.mouse_pos)
+        self.compact_entities()
+        if self.recording is not None:
+            self.recording.append(frame, self.state_hash())
+
+    def state_hash(self):
+        """CRC32 of the simulation state, used to detect replay divergence"""
+        pack = struct.pack
+        p = self.player
+        h = zlib.crc32(pack("<5dQ?", p.x, p.y, p.health, p.missiles, self.current_score,
+                            sim_clock.ticks, p.dead))
+        # Whole columns at a time; stores go by class name, as the world
+        # keeps them in the order they were first created in this process
+        for group, columns in (("enemies", ("x", "y", "health")),
+                               ("player_shots", ("x", "y")), ("enemy_shots", ("x", "y"))):
+            for store, c in sorted(world.query(group, "position"), key=lambda sc: sc[0].cls.__name__):
+                h = zlib.crc32(store.cls.__name__.encode(), h)
+                for name in columns:
+                    h = zlib.crc32(getattr(c, name).tobytes(), h)
+        return h
+
+    def start_session(self, level=None):
+        """Start playing a level, or endless mode when level is None"""
+        if level:
+            self.start_level(level)
+        else:
+            self.current_level = None
+            self.reset_game()
+            self.state = GameState.PLAYING
+
+    def replay(self, recording):
+        """Re-run a recorded session tick by tick.
+
+        Returns the index of the first tick whose state hash differs from
+        the recording, or None if the whole run reproduced exactly.
+        """
+        self.seed = recording.seed
+        upgrades = self.save_data["upgrades"]
+        upgrades["max_health"] = recording.max_health
+        upgrades["shoot_delay"] = recording.shoot_delay
+        self.start_session(recording.level)
+        for index, (frame, expected) in enumerate(recording.frames):
+            self.tick(frame)
+            self.frame += 1
+            if self.state_hash() != expected:
+                return index
+        return None
+
+    def step(self, inputs=None):
+        """Advance the simulation by one frame without drawing anything.
+
+        inputs is an optional dict with "keys" (pygame key constants held
+        down), "mouse_pos", "mouse_down", "mouse_control" and
+        "fire_missile". Returns the state snapshot after the frame.
+        """
+        inputs = inputs or {}
+        flags = 0
+        if inputs.get("mouse_control", self.player.mouse_control) != self.player.mouse_control:
+            flags |= InputFrame.TOGGLE_MOUSE
+        if inputs.get("mouse_down"):
+            flags |= InputFrame.MOUSE_DOWN
+        if inputs.get("fire_missile"):
+            flags |= InputFrame.FIRE_MISSILE
+
+        self.tick(InputFrame.capture(HeadlessKeys(inputs.get("keys", ())),
+                                     inputs.get("mouse_pos", (0, 0)), flags))
+        voices.flush()
+        self.frame += 1
+        return self.get_state()
+
+    def get_state(self):
+        return {
+            "frame": self.frame,
+            "state": self.state.name,
+            "level": self.current_level.number if self.current_level else None,
+            "player": {
+                "x": self.player.x,
+                "y": self.player.y,
+                "health": self.player.health,
+                "missiles": self.player.missiles,
+                "dead": self.player.dead,
             },
-            "unspent_score": 0,
-            "levels_unlocked": 1,
-            "levels_completed": []
+            "score": self.current_score,
+            "planes_destroyed": self.planes_destroyed,
+            "enemies": len(self.enemies),
+            "player_bullets": len(self.player.bullets),
+            "enemy_bullets": len(self.enemy_bullets),
+            "particles": len(global_particles),
+            "pool": pool.stats(),
         }
+
+    def run_headless(self, frames, level=None, input_fn=None):
+        """Step the game for up to `frames` frames as fast as possible.
+
+        input_fn(game) may return the inputs dict for each frame. Stops
+        early once the game leaves the PLAYING state.
+        """
+        self.start_session(level)
+        state = self.get_state()
+        for _ in range(frames):
+            if self.state != GameState.PLAYING:
+                break
+            state = self.step(input_fn(self) if input_fn else None)
+            if tracer.enabled:
+                tracer.end_frame()
+        return state
+
+    def autopilot_inputs(self):
+        """Simple bot for headless runs: hold altitude around mid-screen and keep firing"""
+        keys = [pygame.K_SPACE]
+        if self.player.y > HEIGHT // 2 and self.player.vel_y > -2:
+            keys.append(pygame.K_w)
+        return {"keys": keys, "fire_missile": self.player.missiles > 0 and bool(self.enemies)}
+
+    def reset_for_new_player(self):
+        """Completely reset all progress for a new player"""
+        self.save_data = copy.deepcopy(DEFAULT_SAVE)
         self.save_game()
         
         # Create a new player instance with default values
@@ -1971,113 +4089,410 @@ class Game:
         
         return game_over_button_states
 
-    def run(self):
-        running = True
-        while running:
-            self.handle_events()
+    def handle_shop_buttons(self, shop_button_states):
+        total_available = self.save_data["unspent_score"] + self.current_score
+        
+        if shop_button_states.get('upgrade_health', False) and total_available >= self.player.upgrade_cost_health:
+            if self.current_score >= self.player.upgrade_cost_health:
+                self.current_score -= self.player.upgrade_cost_health
+            else:
+                remaining_cost = self.player.upgrade_cost_health - self.current_score
+                self.current_score = 0
+                self.save_data["unspent_score"] -= remaining_cost
             
-            if self.state == GameState.QUIT:
-                running = False
-                continue
-                
-            # Clear screen
+            self.player.max_health += 10
+            self.player.health = self.player.max_health
+            self.player.upgrade_cost_health = int(self.player.upgrade_cost_health * 1.5)
+            self.save_game()
+            
+        elif shop_button_states.get('upgrade_firerate', False) and total_available >= self.player.upgrade_cost_firerate:
+            if self.current_score >= self.player.upgrade_cost_firerate:
+                self.current_score -= self.player.upgrade_cost_firerate
+            else:
+                remaining_cost = self.player.upgrade_cost_firerate - self.current_score
+                self.current_score = 0
+                self.save_data["unspent_score"] -= remaining_cost
+            
+            self.player.shoot_delay = max(5, self.player.shoot_delay - 3)
+            self.player.upgrade_cost_firerate = int(self.player.upgrade_cost_firerate * 1.75)
+            self.save_game()
+            
+        elif shop_button_states.get('back', False):
+            # When leaving shop, add current score to unspent
+            self.save_data["unspent_score"] += self.current_score
+            self.current_score = 0
+            self.state = GameState.MAIN_MENU
+            self.save_game()
+            pygame.time.delay(200)  # Prevent accidental double clicks
+
+    def handle_game_over_buttons(self, game_over_button_states):
+        if game_over_button_states.get('play_again', False):
+            self.reset_game()
+            self.already_saved = False
+            self.state = GameState.PLAYING
+        elif game_over_button_states.get('menu', False):
+            self.reset_game()
+            self.already_saved = False
+            self.state = GameState.MAIN_MENU
+        elif game_over_button_states.get('quit', False):
+            self.state = GameState.QUIT
+
+    def save_previous_positions(self):
+        self.player.prev_x = self.player.x
+        self.player.prev_y = self.player.y
+        world.save_positions()
+
+    def draw_game_interpolated(self):
+        """Draw the game between the last two simulation ticks.
+
+        Positions are blended by interpolation_alpha for the duration of the
+        draw and then put back, so rendering never feeds into the simulation.
+        """
+        alpha = self.interpolation_alpha
+        if alpha >= 1.0:
+            self.draw_game()
+            return
+
+        player = self.player
+        x, y = player.x, player.y
+        player.x = player.prev_x + (x - player.prev_x) * alpha
+        player.y = player.prev_y + (y - player.prev_y) * alpha
+        try:
+            with world.interpolated(alpha):
+                self.draw_game()
+        finally:
+            player.x, player.y = x, y
+
+    def advance_simulation(self, frame_seconds):
+        """Run as many fixed ticks as the elapsed time calls for.
+
+        Leftover time carries over to the next frame and sets the
+        interpolation factor for rendering. After a long stall at most
+        max_ticks_per_frame ticks run and the rest of the backlog is dropped.
+        """
+        tick_seconds = sim_clock.tick_seconds
+        self.tick_accumulator += frame_seconds * self.time_scale
+        ticks = 0
+        while self.tick_accumulator >= tick_seconds:
+            if ticks == self.max_ticks_per_frame:
+                self.tick_accumulator = 0.0
+                break
+            self.update()
+            self.tick_accumulator -= tick_seconds
+            ticks += 1
+        self.interpolation_alpha = self.tick_accumulator / tick_seconds
+        return ticks
+
+    def update(self):
+        """Update phase: advance the simulation for the current state by one tick"""
+        if self.state == GameState.PLAYING:
+            frame = InputFrame.capture(pygame.key.get_pressed(), pygame.mouse.get_pos(),
+                                       self.pending_flags)
+            self.pending_flags = 0
+            self.save_previous_positions()
+            self.tick(frame)
+        elif self.state == GameState.LOADING:
+            if assets.images_ready:
+                self.state = GameState.MAIN_MENU
+        elif self.state == GameState.GAME_OVER:
+            # Only save once when entering game over state
+            if not self.already_saved:
+                self.save_data["unspent_score"] += self.current_score
+                self.save_data["total_planes_destroyed"] += self.planes_destroyed
+                self.save_game()
+                self.already_saved = True
+
+    def render(self):
+        """Render phase: draw the current state into the back buffer.
+
+        Menus are immediate-mode, so their button handling runs here as the
+        buttons are drawn. Returns True when the frame was drawn with dirty
+        rectangles and only the changed regions need presenting.
+        """
+        dirty_frame = self.dirty_rendering and self.state == GameState.PLAYING
+
+        # Clear screen (dirty-rect frames erase only what changed, in draw_game)
+        if not dirty_frame:
             if bg_img:
                 screen.blit(bg_img, (0, 0))
             else:
                 screen.fill(BLACK)
+        
+        # Draw the appropriate screen
+        if self.state == GameState.LOADING:
+            self.draw_loading_screen()
+        elif self.state == GameState.MAIN_MENU:
+            self.draw_main_menu()
+        elif self.state == GameState.PLAYING:
+            self.draw_game_interpolated()
+        elif self.state == GameState.PAUSED:
+            # Only draw game once when paused (no flickering)
+            if not hasattr(self, 'paused_game_surface'):
+                # Create a surface to store the paused game state
+                self.paused_game_surface = pygame.Surface((WIDTH, HEIGHT))
+                self.draw_game()  # Draw current game state
+                # Copy the current screen to our paused surface
+                self.paused_game_surface.blit(screen, (0, 0))
             
-            # Draw the appropriate screen
-            if self.state == GameState.MAIN_MENU:
-                self.draw_main_menu()
-            elif self.state == GameState.PLAYING:
-                self.update_game()
-                self.draw_game()
-            elif self.state == GameState.PAUSED:
-                # Only draw game once when paused (no flickering)
-                if not hasattr(self, 'paused_game_surface'):
-                    # Create a surface to store the paused game state
-                    self.paused_game_surface = pygame.Surface((WIDTH, HEIGHT))
-                    self.draw_game()  # Draw current game state
-                    # Copy the current screen to our paused surface
-                    self.paused_game_surface.blit(screen, (0, 0))
-                
-                # Draw the paused game state
-                screen.blit(self.paused_game_surface, (0, 0))
-                # Draw pause overlay - reduced alpha for less darkness
-                overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-                overlay.fill((50, 50, 50, 120))  # Changed from (0,0,0,180) to lighter gray
-                screen.blit(overlay, (0, 0))
-                self.draw_pause_menu()
-            elif self.state == GameState.SHOP:
-                shop_button_states = self.draw_shop()
-                total_available = self.save_data["unspent_score"] + self.current_score
-                
-                if shop_button_states.get('upgrade_health', False) and total_available >= self.player.upgrade_cost_health:
-                    if self.current_score >= self.player.upgrade_cost_health:
-                        self.current_score -= self.player.upgrade_cost_health
-                    else:
-                        remaining_cost = self.player.upgrade_cost_health - self.current_score
-                        self.current_score = 0
-                        self.save_data["unspent_score"] -= remaining_cost
-                    
-                    self.player.max_health += 10
-                    self.player.health = self.player.max_health
-                    self.player.upgrade_cost_health = int(self.player.upgrade_cost_health * 1.5)
-                    self.save_game()
-                    
-                elif shop_button_states.get('upgrade_firerate', False) and total_available >= self.player.upgrade_cost_firerate:
-                    if self.current_score >= self.player.upgrade_cost_firerate:
-                        self.current_score -= self.player.upgrade_cost_firerate
-                    else:
-                        remaining_cost = self.player.upgrade_cost_firerate - self.current_score
-                        self.current_score = 0
-                        self.save_data["unspent_score"] -= remaining_cost
-                    
-                    self.player.shoot_delay = max(5, self.player.shoot_delay - 3)
-                    self.player.upgrade_cost_firerate = int(self.player.upgrade_cost_firerate * 1.75)
-                    self.save_game()
-                    
-                elif shop_button_states.get('back', False):
-                    # When leaving shop, add current score to unspent
-                    self.save_data["unspent_score"] += self.current_score
-                    self.current_score = 0
-                    self.state = GameState.MAIN_MENU
-                    self.save_game()
-                    pygame.time.delay(200)  # Prevent accidental double clicks
-                    
-            elif self.state == GameState.GAME_OVER:
-                # Only save once when entering game over state
-                if not self.already_saved:
-                    self.save_data["unspent_score"] += self.current_score
-                    self.save_data["total_planes_destroyed"] += self.planes_destroyed
-                    self.save_game()
-                    self.already_saved = True
-
-                game_over_button_states = self.draw_game_over()
-                
-                if game_over_button_states.get('play_again', False):
-                    self.reset_game()
-                    self.already_saved = False
-                    self.state = GameState.PLAYING
-                elif game_over_button_states.get('menu', False):
-                    self.reset_game()
-                    self.already_saved = False
-                    self.state = GameState.MAIN_MENU
-                elif game_over_button_states.get('quit', False):
-                    self.state = GameState.QUIT
-            elif self.state == GameState.LEVEL_SELECT:
-                self.draw_level_select()
-            elif self.state == GameState.LEVEL_COMPLETE:
-                self.draw_level_complete()
-            
+            # Draw the paused game state
+            screen.blit(self.paused_game_surface, (0, 0))
+            # Draw pause overlay - reduced alpha for less darkness
+            overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+            overlay.fill((50, 50, 50, 120))  # Changed from (0,0,0,180) to lighter gray
+            screen.blit(overlay, (0, 0))
+            self.draw_pause_menu()
+        elif self.state == GameState.SHOP:
+            self.handle_shop_buttons(self.draw_shop())
+        elif self.state == GameState.GAME_OVER:
+            self.handle_game_over_buttons(self.draw_game_over())
+        elif self.state == GameState.LEVEL_SELECT:
+            self.draw_level_select()
+        elif self.state == GameState.LEVEL_COMPLETE:
+            self.draw_level_complete()
+
+        # Clear paused game surface when unpausing
+        if self.state != GameState.PAUSED and hasattr(self, 'paused_game_surface'):
+            del self.paused_game_surface
+
+        if self.show_frame_stats:
+            stats_rect = self.draw_frame_stats()
+            if dirty_frame:
+                self.dirty_regions.mark(stats_rect)
+        if self.show_trace_overlay:
+            overlay_rect = self.draw_trace_overlay()
+            if dirty_frame:
+                self.dirty_regions.mark(overlay_rect)
+
+        return dirty_frame
+
+    def present(self, dirty_frame):
+        """Present phase: the one display update of the frame"""
+        if dirty_frame and self.state == GameState.PLAYING:
+            self.dirty_regions.present()
+        else:
             pygame.display.flip()
-            self.clock.tick(60)
+            self.dirty_regions.invalidate()
+
+    def draw_frame_stats(self):
+        timer = self.frame_timer
+        budget = 1000 / (self.target_fps or sim_clock.tick_rate)
+        parts = []
+        for phase in ("update", "render", "present"):
+            parts.append(f"{phase} {timer.average[phase]:.2f}")
+        text = f"{'  '.join(parts)} ms  ({timer.busy_ms():.1f}/{budget:.1f} ms)"
+        if self.time_scale != 1.0:
+            text += f"  x{self.time_scale:g}"
+        sounds = voices.stats().values()
+        if sounds:
+            text += (f"  sfx {sum(s['played'] for s in sounds)}"
+                     f"/{sum(s['requested'] for s in sounds)}")
+        text_surf = self.instruction_font.render(text, True, YELLOW)
+        rect = text_surf.get_rect(bottomright=(WIDTH - 10, HEIGHT - 10))
+        screen.blit(text_surf, rect)
+        return rect
+
+    def toggle_trace_overlay(self):
+        """F5: show span timings, tracing only while the overlay is up unless a trace file was asked for"""
+        self.show_trace_overlay = not self.show_trace_overlay
+        if self.show_trace_overlay:
+            tracer.enable()
+        elif tracer.path is None:
+            tracer.disable()
+
+    def draw_trace_overlay(self):
+        """One bar per traced span, full width being the whole tick budget"""
+        budget = 1000 / sim_clock.tick_rate
+        averages = tracer.average_ms()
+        x, y = WIDTH - 390, 10
+        bar_x, bar_width = x + 125, 180
+        rect = pygame.Rect(x - 5, y - 5, 390, len(averages) * 20 + 10)
+        overlay = pygame.Surface(rect.size, pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 150))
+        screen.blit(overlay, rect)
+        for span, ms in averages.items():
+            hud_text.draw(screen, self.instruction_font, YELLOW, (x, y), span)
+            pygame.draw.rect(screen, GRAY, (bar_x, y + 4, bar_width, 10))
+            fill = min(bar_width, max(1, int(ms / budget * bar_width)))
+            pygame.draw.rect(screen, RED if ms > budget * 0.25 else GREEN, (bar_x, y + 4, fill, 10))
+            hud_text.draw(screen, self.instruction_font, YELLOW, (bar_x + bar_width + 8, y),
+                          int(ms * 1000), " us")
+            y += 20
+        return rect
+
+    def run(self):
+        timer = self.frame_timer
+        timer.start()
+        last_frame = time.perf_counter()
+        running = True
+        while running:
+            assets.poll()
+            self.handle_events()
+            timer.lap("events")
             
-            # Clear paused game surface when unpausing
-            if hasattr(self, 'paused_game_surface'):
-                del self.paused_game_surface
+            if self.state == GameState.QUIT:
+                running = False
+                continue
+
+            now = time.perf_counter()
+            self.advance_simulation(now - last_frame)
+            voices.flush()
+            last_frame = now
+            timer.lap("update")
+
+            dirty_frame = self.render()
+            timer.lap("render")
+
+            self.present(dirty_frame)
+            timer.lap("present")
+
+            self.clock.tick(self.target_fps)
+            timer.lap("idle")
+            if tracer.enabled:
+                tracer.end_frame()
+
+        save_writer.flush()
+        self.finish_recording()
+        if tracer.path:
+            tracer.save()
+
+tracer = Tracer()
+
+def bootstrap(headless=HEADLESS, sound=True):
+    """Start pygame and the asset loading that importing ps.py leaves undone.
+
+    Only the subsystems the game uses are initialised, each on its own:
+    the display, fonts and (unless sound is False) the mixer. Headless runs
+    use SDL's dummy drivers and load every asset before returning; windowed
+    runs stream them in on the loader thread. Returns the startup profiler.
+    """
+    global HEADLESS, screen
+    HEADLESS = headless
+    if headless:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    with startup_profiler.step("display"):
+        pygame.display.init()
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Plane Shooter")
+    with startup_profiler.step("font"):
+        pygame.font.init()
+    if sound:
+        with startup_profiler.step("mixer"):
+            try:
+                pygame.mixer.init()
+            except pygame.error as e:
+                print(f"No audio device, playing without sound: {e}")
+    with startup_profiler.step("levels"):
+        get_level_set()
+
+    if headless:
+        assets.load_now()
+    else:
+        assets.prewarm = True
+        assets.start()
+    return startup_profiler
+
+startup_profiler.add("import", (time.perf_counter() - startup_profiler.started) * 1000)
 
 # Start the game
 if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Plane Shooter")
+    parser.add_argument("--headless", action="store_true",
+                        help="simulate without a window or rendering")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="redraw and present only the changed screen regions")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="display frame rate cap, 0 for uncapped (simulation always ticks at 60)")
+    parser.add_argument("--frames", type=int, default=3600,
+                        help="headless: number of frames to simulate")
+    parser.add_argument("--level", type=int, default=None,
+                        help="headless: level to play (endless mode if omitted)")
+    parser.add_argument("--autopilot", action="store_true",
+                        help="headless: fly and shoot with a simple bot instead of no input")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed every session with this value instead of a random one")
+    parser.add_argument("--record", metavar="FILE", default=None,
+                        help="record the seed and per-tick inputs of the first session to FILE, "
+                             "and of later ones to FILE-2, FILE-3...")
+    parser.add_argument("--replay", metavar="FILE", default=None,
+                        help="replay a recording headless and check it reproduces exactly")
+    parser.add_argument("--check-levels", metavar="FILE", default=None,
+                        help="validate a level file and exit")
+    parser.add_argument("--convert-save", nargs=2, metavar=("SOURCE", "TARGET"), default=None,
+                        help="convert a save between the JSON layout and the binary one and exit")
+    parser.add_argument("--check-saves", action="store_true",
+                        help="check the binary save format round-trips and recovers, and exit")
+    parser.add_argument("--trace", metavar="FILE", default=None,
+                        help="trace frame stages and write a Chrome/Perfetto trace to FILE on exit")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the time taken by each startup step")
+    args = parser.parse_args()
+
+    if args.check_levels:
+        try:
+            checked = LevelSet.load(args.check_levels)
+        except (OSError, ValueError) as e:
+            print(e)
+            sys.exit(1)
+        print(f"{args.check_levels}: {len(checked)} levels OK")
+        sys.exit(0)
+
+    if args.convert_save:
+        source, target = args.convert_save
+        try:
+            convert_save(source, target)
+        except (OSError, ValueError) as e:
+            print(e)
+            sys.exit(1)
+        print(f"Converted {source} to {target}")
+        sys.exit(0)
+
+    if args.check_saves:
+        failures = check_save_format()
+        for failure in failures:
+            print(f"FAILED: {failure}")
+        print("save format checks " + ("failed" if failures else "OK"))
+        sys.exit(1 if failures else 0)
+
+    bootstrap(headless=HEADLESS)
+    with startup_profiler.step("game"):
+        game = Game(save_file=None if HEADLESS else "savegame.psav")
+    if args.profile_startup:
+        atexit.register(lambda: print(startup_profiler.report(), file=sys.stderr))
+
+    if args.trace:
+        tracer.path = args.trace
+        tracer.enable()
+
+    if args.replay:
+        recording = InputRecording.load(args.replay)
+        diverged = game.replay(recording)
+        if tracer.path:
+            tracer.save()
+        state = game.get_state()
+        state["seed"] = recording.seed
+        state["recorded_ticks"] = len(recording)
+        state["diverged_at"] = diverged
+        print(json.dumps(state, indent=4))
+        sys.exit(1 if diverged is not None else 0)
+    elif HEADLESS:
+        game.seed = args.seed
+        game.record_path = args.record
+        start = time.perf_counter()
+        state = game.run_headless(args.frames, level=args.level,
+                                  input_fn=Game.autopilot_inputs if args.autopilot else None)
+        elapsed = time.perf_counter() - start
+        game.finish_recording()
+        if tracer.path:
+            tracer.save()
+        state["seed"] = game.session_seed
+        state["sound"] = voices.stats()
+        state["fps"] = round(state["frame"] / elapsed) if elapsed > 0 else None
+        print(json.dumps(state, indent=4))
+    else:
+        game.target_fps = args.fps
+        game.seed = args.seed
+        game.record_path = args.record
+        game.run()
\ No newline at end of file